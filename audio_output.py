@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from livekit import rtc
+
+logger = logging.getLogger("transcriber")
+
+
+class SessionAudioOutput:
+    """One published audio track per session, fed from a preallocated ring of frames.
+
+    The ring is a fixed set of frame-sized buffers, each wrapped once in an
+    rtc.AudioFrame. write() copies PCM into the free buffers through memoryview
+    slices; a frame that is full is handed to the AudioSource as is. The FFI
+    only copies a buffer it can't address whole, so there are no per-frame
+    allocations or copies on the way out. Frames are paced against the
+    monotonic clock, never more than `lead_ms` ahead of real time, so a
+    barge-in (clear()) drops at most that much queued audio.
+    """
+
+    def __init__(self, room: rtc.Room, *, sample_rate: int = 48000, num_channels: int = 1, frame_ms: int = 20,
+                 buffer_ms: int = 1000, lead_ms: int = 60, track_name: str = "agent_audio") -> None:
+        if frame_ms not in (10, 20):
+            raise ValueError("frame_ms must be 10 or 20")
+        self.room = room
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.track_name = track_name
+        self._samples_per_frame = sample_rate * frame_ms // 1000
+        self._frame_bytes = self._samples_per_frame * num_channels * 2
+        self._frame_duration = frame_ms / 1000
+        self._lead = lead_ms / 1000
+
+        slots = max(2, buffer_ms // frame_ms)
+        self._buffers = [bytearray(self._frame_bytes) for _ in range(slots)]
+        self._views = [memoryview(buf) for buf in self._buffers]
+        self._frames = [
+            rtc.AudioFrame(data=buf, sample_rate=sample_rate, num_channels=num_channels, samples_per_channel=self._samples_per_frame)
+            for buf in self._buffers
+        ]
+        self._free: deque[int] = deque(range(slots))
+        self._ready: deque[int] = deque()
+        self._filling: int | None = None
+        self._filled = 0
+
+        self._space = asyncio.Event()
+        self._has_frames = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+        self._source: rtc.AudioSource | None = None
+        self._publication: rtc.LocalTrackPublication | None = None
+        self._pump_task: asyncio.Task | None = None
+        self._clock_start = 0.0
+        self._frames_sent = 0
+
+    async def start(self) -> None:
+        # published once, every utterance of the session goes through this track
+        if self._source is not None:
+            return
+        self._source = rtc.AudioSource(self.sample_rate, self.num_channels, queue_size_ms=int(self._lead * 1000) * 2)
+        track = rtc.LocalAudioTrack.create_audio_track(self.track_name, self._source)
+        options = rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE)
+        self._publication = await self.room.local_participant.publish_track(track, options)
+        self._pump_task = asyncio.create_task(self._pump(), name="session-audio-pump")
+
+    async def write(self, data: bytes | bytearray | memoryview) -> None:
+        src = memoryview(data).cast("B")
+        while src:
+            if self._filling is None:
+                while not self._free:
+                    self._space.clear()
+                    await self._space.wait()
+                self._filling = self._free.popleft()
+                self._filled = 0
+            n = min(len(src), self._frame_bytes - self._filled)
+            self._views[self._filling][self._filled : self._filled + n] = src[:n]
+            self._filled += n
+            src = src[n:]
+            if self._filled == self._frame_bytes:
+                self._commit()
+
+    def _commit(self) -> None:
+        self._ready.append(self._filling)
+        self._filling = None
+        self._drained.clear()
+        self._has_frames.set()
+
+    async def flush(self) -> None:
+        """Pad the last partial frame with silence and wait until everything is sent."""
+        if self._filling is not None:
+            self._views[self._filling][self._filled :] = bytes(self._frame_bytes - self._filled)
+            self._commit()
+        await self._drained.wait()
+
+    def clear(self) -> None:
+        """Drop everything not yet sent, e.g. when the user interrupts."""
+        if self._filling is not None:
+            self._free.append(self._filling)
+            self._filling = None
+        self._free.extend(self._ready)
+        self._ready.clear()
+        self._space.set()
+        self._drained.set()
+        if self._source is not None:
+            self._source.clear_queue()
+
+    async def _pump(self) -> None:
+        while True:
+            if not self._ready:
+                self._drained.set()
+                self._has_frames.clear()
+                await self._has_frames.wait()
+                # a new utterance restarts the clock
+                self._clock_start = time.monotonic()
+                self._frames_sent = 0
+
+            index = self._ready.popleft()
+            ahead = self._clock_start + self._frames_sent * self._frame_duration - time.monotonic()
+            if ahead > self._lead:
+                await asyncio.sleep(ahead - self._lead)
+            try:
+                await self._source.capture_frame(self._frames[index])
+            except Exception as e:
+                logger.error(f"Error sending audio frame: {e}")
+            self._frames_sent += 1
+            # the FFI has consumed the buffer once capture_frame returns
+            self._free.append(index)
+            self._space.set()
+
+    async def aclose(self) -> None:
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+        if self._publication is not None:
+            await self.room.local_participant.unpublish_track(self._publication.sid)
+            self._publication = None
+        if self._source is not None:
+            await self._source.aclose()
+            self._source = None
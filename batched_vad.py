@@ -0,0 +1,138 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from livekit.plugins import silero
+from livekit.plugins.silero import onnx_model
+from livekit.plugins.silero.vad import VADStream
+
+logger = logging.getLogger("soul_agent")
+
+MAX_BATCH = 64
+MAX_DELAY = float(os.getenv("VAD_BATCH_MAX_DELAY_MS", "4")) / 1000
+
+
+class _Request:
+    __slots__ = ("input", "state", "done", "probability", "next_state", "error")
+
+    def __init__(self, input: np.ndarray, state: np.ndarray) -> None:
+        self.input = input
+        self.state = state
+        self.done = threading.Event()
+        self.probability = 0.0
+        self.next_state = state
+        self.error: BaseException | None = None
+
+
+class _Batcher:
+    """Runs the windows of every live stream through one ONNX call.
+
+    The first request opens a batch; it is run as soon as every live stream
+    has a window in it, or after `max_delay`, whichever comes first.
+    """
+
+    def __init__(self, session, live_streams, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY) -> None:
+        self._session = session
+        self._live_streams = live_streams
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._queue: queue.SimpleQueue[_Request] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.windows = 0
+
+    def infer(self, input: np.ndarray, state: np.ndarray, sample_rate: np.ndarray) -> tuple[float, np.ndarray]:
+        # called from the session loops' executor threads, blocks until the batch has run
+        if len(self._live_streams) <= 1:
+            # nothing to batch with (one room per process), skip the hand-off to the batch thread
+            out, next_state = self._session.run(None, {"input": input, "state": state, "sr": sample_rate})
+            return float(out[0, 0]), next_state
+        self._ensure_thread(sample_rate)
+        request = _Request(input, state)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.probability, request.next_state
+
+    def _ensure_thread(self, sample_rate: np.ndarray) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._sample_rate = sample_rate
+                self._thread = threading.Thread(target=self._run, name="vad-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[_Request]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self._max_delay
+        expected = min(self._max_batch, max(1, len(self._live_streams)))
+        while len(batch) < expected:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                inputs = np.concatenate([r.input for r in batch], axis=0)
+                states = np.concatenate([r.state for r in batch], axis=1)
+                out, next_states = self._session.run(None, {"input": inputs, "state": states, "sr": self._sample_rate})
+                for i, request in enumerate(batch):
+                    request.probability = float(out[i, 0])
+                    request.next_state = next_states[:, i : i + 1, :].copy()
+            except Exception as e:
+                logger.error(f"Batched VAD inference failed: {e}")
+                for request in batch:
+                    request.error = e
+            self.batches += 1
+            self.windows += len(batch)
+            for request in batch:
+                request.done.set()
+
+
+class _BatchedOnnxModel(onnx_model.OnnxModel):
+    # Keeps the per-stream recurrent state and context like OnnxModel, only the ONNX call is shared
+    def __init__(self, *, batcher: _Batcher, onnx_session, sample_rate: int) -> None:
+        super().__init__(onnx_session=onnx_session, sample_rate=sample_rate)
+        self._batcher = batcher
+
+    def __call__(self, x: np.ndarray) -> float:
+        self._input_buffer[:, : self._context_size] = self._context
+        self._input_buffer[:, self._context_size :] = x
+        probability, self._rnn_state = self._batcher.infer(self._input_buffer.copy(), self._rnn_state, self._sample_rate_nd)
+        self._context = self._input_buffer[:, -self._context_size :].copy()
+        return probability
+
+
+class BatchedVAD(silero.VAD):
+    """silero.VAD whose streams share batched inference.
+
+    Every session hosted by the process gets its own VADStream as before, but
+    their 32ms windows are stacked into one ONNX call, so VAD CPU grows slower
+    than the number of concurrent calls. Build it with BatchedVAD.load().
+    """
+
+    def __init__(self, *, session, opts) -> None:
+        super().__init__(session=session, opts=opts)
+        self._batcher = _Batcher(session, self._streams)
+
+    def stream(self) -> VADStream:
+        stream = VADStream(
+            self,
+            self._opts,
+            _BatchedOnnxModel(batcher=self._batcher, onnx_session=self._onnx_session, sample_rate=self._opts.sample_rate),
+        )
+        self._streams.add(stream)
+        return stream
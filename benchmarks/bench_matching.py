@@ -0,0 +1,104 @@
+"""Top-k match latency over N synthetic profiles, naive pairwise loop vs MatchIndex.
+
+    python -m benchmarks.bench_matching --profiles 10000 100000 --queries 50
+
+Both score with the same weights; every query's top-k scores are checked to agree.
+Likes are free text, so the vocabulary grows with the population: most terms
+come from a common pool, the rest from a long tail of about n / 2 terms.
+"""
+
+import argparse
+import os
+import random
+import time
+
+from matching import CONFLICT, SAME_DREAM_CITY, SAME_HOMETOWN, SHARED_DISLIKE, SHARED_LIKE, MatchIndex
+from profile_store import Profile
+
+CITIES = [f"city-{i}" for i in range(300)]
+COMMON_TERMS = 2000
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _terms(count: int, vocabulary: int, rng: random.Random) -> list[str]:
+    terms: set[str] = set()
+    while len(terms) < count:
+        # 70% from the common pool, the rest anywhere in the vocabulary
+        terms.add(f"term-{rng.randrange(COMMON_TERMS if rng.random() < 0.7 else vocabulary)}")
+    return list(terms)
+
+
+def _profiles(n: int, rng: random.Random) -> list[Profile]:
+    vocabulary = COMMON_TERMS + n // 2
+    profiles = []
+    for i in range(n):
+        terms = _terms(rng.randint(2, 12), vocabulary, rng)
+        split = rng.randint(1, len(terms) - 1)
+        profiles.append(Profile(
+            user_id=f"user-{i}",
+            hometown=rng.choice(CITIES),
+            dream_city=rng.choice(CITIES),
+            height_cm=rng.randint(150, 200),
+            likes=sorted(terms[:split]),
+            dislikes=sorted(terms[split:]),
+        ))
+    return profiles
+
+
+def _naive_top_k(profiles: list[Profile], me: Profile, k: int) -> list[int]:
+    my_likes, my_dislikes = set(me.likes), set(me.dislikes)
+    scores = []
+    for other in profiles:
+        if other.user_id == me.user_id:
+            continue
+        likes = set(other.likes)
+        score = (SHARED_LIKE * len(my_likes & likes)
+                 + SHARED_DISLIKE * len(my_dislikes & set(other.dislikes))
+                 + CONFLICT * len(my_dislikes & likes)
+                 + SAME_DREAM_CITY * (other.dream_city == me.dream_city)
+                 + SAME_HOMETOWN * (other.hometown == me.hometown))
+        if score > 0:
+            scores.append(score)
+    return sorted(scores, reverse=True)[:k]
+
+
+def main(args) -> None:
+    rng = random.Random(7)
+    print(f"{'profiles':>9} {'terms':>8} {'memory':>9} {'build':>8} {'naive p50':>10} {'index p50':>10} {'speedup':>8}")
+    for n in args.profiles:
+        profiles = _profiles(n, rng)
+        queries = rng.sample(profiles, args.queries)
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        index = MatchIndex.from_profiles(profiles)
+        build = time.perf_counter() - start
+        # the posting arrays plus the vocabulary and per-profile bookkeeping
+        memory = max(index.nbytes, _rss_bytes() - rss_before)
+
+        naive, indexed = [], []
+        for me in queries:
+            start = time.perf_counter()
+            expected = _naive_top_k(profiles, me, args.k)
+            naive.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            got = [match.score for match in index.top_k(me, args.k)]
+            indexed.append(time.perf_counter() - start)
+            assert got == expected, f"score mismatch for {me.user_id}: {got} != {expected}"
+
+        naive_p50 = sorted(naive)[len(naive) // 2] * 1000
+        index_p50 = sorted(indexed)[len(indexed) // 2] * 1000
+        print(f"{n:>9} {len(index._terms):>8} {memory / 2**20:>6.1f}MiB {build:>7.2f}s {naive_p50:>8.2f}ms {index_p50:>8.2f}ms {naive_p50 / index_p50:>7.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,60 @@
+"""CPU cost of silero VAD with N concurrent streams, per-stream vs batched inference.
+
+    python -m benchmarks.bench_vad --streams 1 8 32 --seconds 5
+
+Each stream feeds a 32ms window every 32ms from its own thread, like the
+executor threads VADStream uses.
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+from livekit.plugins.silero import onnx_model
+
+from batched_vad import _BatchedOnnxModel, _Batcher
+
+WINDOW = 512
+PERIOD = WINDOW / 16000
+
+
+def _drive(model, seconds: float, noise: np.ndarray) -> None:
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    i = 0
+    while next_at < deadline:
+        model(noise[i % len(noise)])
+        i += 1
+        next_at += PERIOD
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+
+
+def _run(models: list, seconds: float) -> float:
+    noise = (np.random.randn(64, WINDOW) * 0.1).astype(np.float32)
+    threads = [threading.Thread(target=_drive, args=(model, seconds, noise)) for model in models]
+    cpu = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.process_time() - cpu
+
+
+def main(args) -> None:
+    session = onnx_model.new_inference_session(force_cpu=True)
+    print(f"{'streams':>8} {'per-stream cpu':>15} {'batched cpu':>12} {'avg batch':>10}")
+    for n in args.streams:
+        plain = _run([onnx_model.OnnxModel(onnx_session=session, sample_rate=16000) for _ in range(n)], args.seconds)
+
+        live = set(range(n))
+        batcher = _Batcher(session, live)
+        batched = _run([_BatchedOnnxModel(batcher=batcher, onnx_session=session, sample_rate=16000) for _ in range(n)], args.seconds)
+        print(f"{n:>8} {plain / args.seconds:>14.1%} {batched / args.seconds:>11.1%} {batcher.windows / max(1, batcher.batches):>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=5)
+    main(parser.parse_args())
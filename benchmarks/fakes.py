@@ -0,0 +1,235 @@
+"""Offline stand-ins for Deepgram, Groq/Gemini and Cartesia/ElevenLabs.
+
+They implement the same livekit-agents plugin interfaces as the real
+providers, so an AgentSession built from them runs the full pipeline
+without any network access.
+"""
+
+import asyncio
+import math
+import struct
+import time
+from dataclasses import dataclass, field
+
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+from livekit.agents.voice.io import AudioInput, AudioOutput, AudioOutputCapabilities
+
+SAMPLE_RATE = 24000
+FRAME_MS = 20
+
+
+@dataclass
+class CallerStats:
+    turn_gaps: list[float] = field(default_factory=list)
+    turns: int = 0
+
+
+class Caller:
+    """The simulated user of one room: waits for the agent to ask, then answers.
+
+    The agent's question is considered asked once it has stopped speaking and
+    stayed quiet for `think` seconds. Turn gaps are measured from the end of the
+    user's speech to the first audio frame of the agent's reply.
+    """
+
+    def __init__(self, answers: list[str], think: float = 0.4, word_interval: float = 0.15) -> None:
+        self.answers = list(answers)
+        self.think = think
+        self.word_interval = word_interval
+        self.stats = CallerStats()
+        self.done = asyncio.Event()
+        self._agent_quiet = asyncio.Event()
+        self._speech_ended_at: float | None = None
+
+    def attach(self, session) -> None:
+        @session.on("agent_state_changed")
+        def _on_agent_state_changed(ev):
+            if ev.new_state == "speaking":
+                self._agent_quiet.clear()
+            elif ev.old_state == "speaking":
+                self._agent_quiet.set()
+
+    def on_agent_audio(self) -> None:
+        if self._speech_ended_at is not None:
+            self.stats.turn_gaps.append((time.perf_counter() - self._speech_ended_at) * 1000)
+            self._speech_ended_at = None
+
+    async def wait_for_question(self) -> None:
+        while True:
+            await self._agent_quiet.wait()
+            await asyncio.sleep(self.think)
+            if self._agent_quiet.is_set():
+                return
+
+    def speech_ended(self) -> None:
+        self.stats.turns += 1
+        # the next question only counts once the agent has spoken again
+        self._agent_quiet.clear()
+        self._speech_ended_at = time.perf_counter()
+
+
+class FakeSTT(stt.STT):
+    def __init__(self, caller: Caller) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self._caller = caller
+
+    async def _recognize_impl(self, buffer, *, language: NotGivenOr[str] = NOT_GIVEN,
+                              conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> stt.SpeechEvent:
+        raise NotImplementedError("FakeSTT only streams")
+
+    def stream(self, *, language: NotGivenOr[str] = NOT_GIVEN,
+               conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "FakeSTTStream":
+        return FakeSTTStream(stt=self, conn_options=conn_options)
+
+
+class FakeSTTStream(stt.RecognizeStream):
+    """Streams the caller's canned answers word by word, like Deepgram interim results."""
+
+    async def _run(self) -> None:
+        caller: Caller = self._stt._caller
+        drain = asyncio.create_task(self._drain())
+        try:
+            while caller.answers:
+                await caller.wait_for_question()
+                answer = caller.answers.pop(0)
+                self._emit(stt.SpeechEventType.START_OF_SPEECH)
+                words = answer.split()
+                for i in range(1, len(words) + 1):
+                    await asyncio.sleep(caller.word_interval)
+                    self._emit(stt.SpeechEventType.INTERIM_TRANSCRIPT, " ".join(words[:i]))
+                self._emit(stt.SpeechEventType.FINAL_TRANSCRIPT, answer)
+                self._emit(stt.SpeechEventType.END_OF_SPEECH)
+                caller.speech_ended()
+            await caller.wait_for_question()
+            caller.done.set()
+        finally:
+            await utils.aio.cancel_and_wait(drain)
+
+    async def _drain(self) -> None:
+        # the input audio is silence, it only has to be consumed
+        async for _ in self._input_ch:
+            pass
+
+    def _emit(self, type: stt.SpeechEventType, text: str = "") -> None:
+        alternatives = [stt.SpeechData(language="en-US", text=text, confidence=1.0)] if text else []
+        self._event_ch.send_nowait(stt.SpeechEvent(type=type, alternatives=alternatives))
+
+
+class FakeLLM(llm.LLM):
+    def __init__(self, reply: str = "NONE", ttft: float = 0.3, token_interval: float = 0.02) -> None:
+        super().__init__()
+        self.reply = reply
+        self.ttft = ttft
+        self.token_interval = token_interval
+
+    def chat(self, *, chat_ctx: llm.ChatContext, tools: list | None = None,
+             conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> "FakeLLMStream":
+        return FakeLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        fake: FakeLLM = self._llm
+        request_id = utils.shortuuid()
+        await asyncio.sleep(fake.ttft)
+        for i, token in enumerate(fake.reply.split(" ")):
+            if i:
+                await asyncio.sleep(fake.token_interval)
+            content = token if i == 0 else " " + token
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=content)))
+
+
+def _tone_chunk(sample_rate: int, ms: int, freq: float = 220.0) -> bytes:
+    samples = sample_rate * ms // 1000
+    return struct.pack(f"<{samples}h", *(int(8000 * math.sin(2 * math.pi * freq * i / sample_rate)) for i in range(samples)))
+
+
+class FakeTTS(tts.TTS):
+    """Synthetic PCM, `seconds_per_word` of a tone per word after `ttfb`."""
+
+    def __init__(self, ttfb: float = 0.2, seconds_per_word: float = 0.3, sample_rate: int = SAMPLE_RATE) -> None:
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1)
+        self.ttfb = ttfb
+        self.seconds_per_word = seconds_per_word
+        self._chunk = _tone_chunk(sample_rate, FRAME_MS)
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "FakeChunkedStream":
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        fake: FakeTTS = self._tts
+        output_emitter.initialize(request_id=utils.shortuuid(), sample_rate=fake.sample_rate, num_channels=1, mime_type="audio/pcm")
+        await asyncio.sleep(fake.ttfb)
+        chunks = max(1, int(len(self._input_text.split()) * fake.seconds_per_word * 1000 / FRAME_MS))
+        for _ in range(chunks):
+            output_emitter.push(fake._chunk)
+        output_emitter.flush()
+
+
+class SilenceInput(AudioInput):
+    """A microphone that produces 20ms of silence every 20ms."""
+
+    def __init__(self, sample_rate: int = 16000) -> None:
+        super().__init__(label="bench-silence")
+        samples = sample_rate * FRAME_MS // 1000
+        self._frame = rtc.AudioFrame(data=bytes(samples * 2), sample_rate=sample_rate, num_channels=1, samples_per_channel=samples)
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        await asyncio.sleep(FRAME_MS / 1000)
+        return self._frame
+
+
+class PacedAudioSink(AudioOutput):
+    """Accepts frames immediately and reports each segment as played out in real time."""
+
+    def __init__(self, caller: Caller) -> None:
+        super().__init__(label="bench-sink", capabilities=AudioOutputCapabilities(pause=False))
+        self._caller = caller
+        self._capturing = False
+        self._playout_end = 0.0
+        self._pending: list[tuple[asyncio.TimerHandle, float, float]] = []
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if not self._capturing:
+            self._capturing = True
+            self._segment_start = max(time.monotonic(), self._playout_end)
+            self._playout_end = self._segment_start
+            self.on_playback_started(created_at=time.time())
+            self._caller.on_agent_audio()
+        self._playout_end += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if not self._capturing:
+            return
+        self._capturing = False
+        start, end = self._segment_start, self._playout_end
+        handle = asyncio.get_running_loop().call_later(max(0.0, end - time.monotonic()), self._finish, start, end)
+        self._pending.append((handle, start, end))
+
+    def clear_buffer(self) -> None:
+        now = time.monotonic()
+        if self._capturing:
+            self.flush()
+        for handle, start, end in self._pending:
+            handle.cancel()
+            self.on_playback_finished(playback_position=max(0.0, min(now, end) - start), interrupted=True)
+        self._pending.clear()
+        self._playout_end = now
+
+    def _finish(self, start: float, end: float) -> None:
+        self._pending = [p for p in self._pending if p[1] != start]
+        self.on_playback_finished(playback_position=end - start, interrupted=False)
@@ -0,0 +1,74 @@
+"""Import time and memory of each agent entry module, as paid by a cold worker process.
+
+    python -m benchmarks.import_profile --modules api server trying --top 12
+
+Every module is imported in a fresh interpreter under `-X importtime`, like
+the worker's main process and every spawned job process do. The report
+gives the wall time and RSS after the import, and the packages the time
+went to, so a plugin that is imported but never used shows up by name.
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+from collections import defaultdict
+
+_PROBE = """
+import time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from plugin_registry import plugins
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * {page_size}
+print(f"{{elapsed * 1000:.0f}} {{rss}} {{','.join(plugins.preload_modules())}}")
+"""
+
+
+def _group(module: str) -> str:
+    parts = module.split(".")
+    if parts[:2] == ["livekit", "plugins"] and len(parts) > 2:
+        return ".".join(parts[:3])
+    if parts[0] == "livekit" and len(parts) > 1:
+        return ".".join(parts[:2])
+    return parts[0]
+
+
+def profile(module: str) -> tuple[float, int, list[str], dict[str, float]]:
+    probe = _PROBE.format(module=module, page_size=resource.getpagesize())
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    by_group: dict[str, float] = defaultdict(float)
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_group[_group(name.strip())] += int(self_us) / 1000
+
+    elapsed_ms, rss, selected = result.stdout.splitlines()[-1].split(" ", 2)
+    return float(elapsed_ms), int(rss), [m for m in selected.split(",") if m], dict(by_group)
+
+
+def main(args) -> None:
+    for module in args.modules:
+        try:
+            elapsed_ms, rss, selected, by_group = profile(module)
+        except RuntimeError as e:
+            print(f"{module}: {e}\n")
+            continue
+        print(f"{module}: {elapsed_ms:.0f}ms to import, {rss / 2**20:.0f} MB RSS")
+        print(f"  selected plugins: {', '.join(selected) or 'none'}")
+        for group, ms in sorted(by_group.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+            print(f"  {ms:8.1f}ms  {group}")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["api", "server", "trail2", "trying", "soul_agent"])
+    parser.add_argument("--top", type=int, default=12)
+    main(parser.parse_args())
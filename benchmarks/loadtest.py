@@ -0,0 +1,191 @@
+"""Concurrent onboarding calls against one worker process, fully offline.
+
+Runs the real SoulInfoAgent from api.py (or server.py) in N AgentSessions on
+one event loop, with the providers replaced by benchmarks.fakes. Each room's
+caller answers every profile question, and the run reports turn gaps, event
+loop lag, CPU and memory per session.
+
+    python -m benchmarks.loadtest --rooms 20 --llm-ttft 0.3 --tts-ttfb 0.2
+
+The entrypoints themselves need a LiveKit room, so the session is assembled
+here the same way they do it, minus the room I/O.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import logging
+import os
+import statistics
+import sys
+import time
+
+from livekit.agents import AgentSession
+
+from conversation_log import get_conversation_log
+from loop_watchdog import watch_loop
+from session_snapshots import SessionSnapshotter, open_snapshot_store
+
+from benchmarks.fakes import Caller, FakeLLM, FakeSTT, FakeTTS, PacedAudioSink, SilenceInput
+
+# by slot, the caller answers in the order the agent asks
+ANSWERS = {
+    "name": "my name is Priya Sharma",
+    "dream_city": "I'd love to live in Lisbon because of the sea",
+    "hometown": "I grew up in Pune",
+    "likes": "I like hiking, old films and cooking",
+    "dislikes": "um I guess loud people and traffic",
+    "height": "I'm five foot six",
+}
+
+
+class _ErrorCounter(logging.Handler):
+    """Errors logged during the run: the turn hook logs a failed turn instead of raising, the framework logs what it raises."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.ERROR)
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _percentiles(values: list[float], digits: int = 0) -> str:
+    if not values:
+        return "n/a"
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+    return f"p50 {pick(50):.{digits}f}ms  p95 {pick(95):.{digits}f}ms  p99 {pick(99):.{digits}f}ms  max {values[-1]:.{digits}f}ms"
+
+
+async def _run_room(room: str, module, args, snapshotters: list[SessionSnapshotter]):
+    watch_loop(room)
+    caller = Caller([], think=args.think)
+    fake_stt = FakeSTT(caller)
+    fake_llm = FakeLLM(ttft=args.llm_ttft)
+    fake_tts = FakeTTS(ttfb=args.tts_ttfb)
+
+    session = AgentSession(stt=fake_stt, llm=fake_llm, tts=fake_tts, turn_detection="stt")
+    session.input.audio = SilenceInput()
+    session.output.audio = PacedAudioSink(caller)
+    caller.attach(session)
+
+    snapshots = None
+    if args.snapshots:
+        snapshots = SessionSnapshotter(args.snapshot_store, room, f"{room}-caller")
+        snapshotters.append(snapshots)
+
+    if module.__name__ == "server":
+        agent = module.SoulInfoAgent(session=session, stt_engine=fake_stt, llm_engine=fake_llm, tts_engine=fake_tts,
+                                     vad_engine=None, turn_detector="stt", user_id=f"{room}-caller", session_id=room,
+                                     snapshots=snapshots)
+    else:
+        agent = module.SoulInfoAgent(session=session, stt_engine=fake_stt, llm_engine=fake_llm, tts_engine=fake_tts,
+                                     vad_engine=None, user_id=f"{room}-caller", snapshots=snapshots)
+    caller.answers = [ANSWERS[slot.key] for slot in agent.slots]
+
+    await session.start(agent=agent, record=False)
+    try:
+        await asyncio.wait_for(caller.done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        logging.warning(f"room timed out after {caller.stats.turns} turns")
+    await session.aclose()
+    if snapshots is not None:
+        await snapshots.aclose()
+    return caller, agent
+
+
+async def _sample_loop_lag(lags: list[float], interval: float = 0.05) -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def main(args) -> tuple[list[str], list[str]]:
+    module = importlib.import_module(args.agent)
+    args.snapshot_store = open_snapshot_store(args.snapshots) if args.snapshots else None
+    get_conversation_log()  # opened at prewarm by the worker
+    snapshotters: list[SessionSnapshotter] = []
+
+    lags: list[float] = []
+    sampler = asyncio.create_task(_sample_loop_lag(lags))
+    error_counter = _ErrorCounter()
+    # the framework logs the exceptions of the agent's hooks (on_enter, on_user_turn_completed, on_exit) itself
+    for name in ("soul_agent", "livekit.agents"):
+        logging.getLogger(name).addHandler(error_counter)
+    rss_before = _rss_bytes()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+
+    rooms = []
+    for _ in range(args.rooms):
+        rooms.append(asyncio.create_task(_run_room(f"bench-{len(rooms)}", module, args, snapshotters)))
+        await asyncio.sleep(args.ramp)
+    peak_rss = _rss_bytes()
+    results = await asyncio.gather(*rooms)
+    callers = [caller for caller, _ in results]
+
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    sampler.cancel()
+    watchdog = watch_loop("bench")
+    offenders = watchdog.worst_offenders(3)
+
+    gaps = [gap for caller in callers for gap in caller.stats.turn_gaps]
+    turns = sum(caller.stats.turns for caller in callers)
+    cores_used = cpu / wall if wall else 0.0
+    snapshot_updates = [us / 1000 for s in snapshotters for us in s.update_us]
+    snapshot_writes = [ms for s in snapshotters for ms in s.write_ms]
+
+    failures = []
+    for index, (caller, agent) in enumerate(results):
+        if not agent.collected_info:
+            failures.append(f"bench-{index}: no slot filled in {caller.stats.turns} turns")
+    failures.extend(f"{record.name}: {record.getMessage()}" for record in error_counter.records)
+    for name in ("soul_agent", "livekit.agents"):
+        logging.getLogger(name).removeHandler(error_counter)
+
+    report = [
+        f"rooms:              {args.rooms} ({turns} user turns in {wall:.1f}s)",
+        f"cpu:                {cpu:.1f}s, {cores_used:.2f} cores busy",
+        f"sessions per core:  {args.rooms / cores_used:.0f} (extrapolated from CPU time)" if cores_used else "sessions per core:  n/a",
+        f"turn gap:           {_percentiles(gaps)}",
+        f"event loop lag:     {_percentiles(lags)}  mean {statistics.fmean(lags) if lags else 0:.1f}ms",
+        f"loop stalls:        {sum(watchdog.stalls_by_room.values())} over {watchdog.threshold * 1000:.0f}ms"
+        + "".join(f"\n  {location}: {o.count}x, worst {o.max_ms:.0f}ms" for location, o in offenders),
+        f"slots filled:       {sum(len(agent.collected_info) for _, agent in results)} of "
+        f"{sum(len(agent.slots) for _, agent in results)}",
+        f"memory per session: {(peak_rss - rss_before) / args.rooms / 1024 / 1024:.1f} MiB (RSS growth at full load)",
+    ] + ([
+        f"snapshot on loop:   {_percentiles(snapshot_updates, 3)}",
+        f"snapshot writes:    {_percentiles(snapshot_writes, 1)} ({len(snapshot_writes)} of {len(snapshot_updates)} written)",
+    ] if args.snapshots else [])
+    return report, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agent", default="api", choices=["api", "server"], help="module to take SoulInfoAgent from")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=0.05, help="seconds between room starts")
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--tts-ttfb", type=float, default=0.2)
+    parser.add_argument("--think", type=float, default=0.4, help="caller pause before answering")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--snapshots", help="session snapshot store to write to, a .db file or a directory")
+    logging.basicConfig(level=logging.WARNING)
+    # the agents print every turn, keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report, failures = asyncio.run(main(parser.parse_args()))
+    print("\n".join(report))
+    if failures:
+        # a run whose turns failed measures nothing, it must not pass as a result
+        print(f"\nFAILED, {len(failures)} errors:\n" + "\n".join(f"  {failure}" for failure in failures[:20]))
+        sys.exit(1)
@@ -0,0 +1,107 @@
+"""Restore and rollback checks for both session snapshot stores, exits non-zero on a failure.
+
+    python -m benchmarks.snapshot_handoff --writers 8 --writes 200
+
+For the SQLite and the file store alike: a replacement worker resumes the
+call where the drained one left it, a late write from the drained worker
+never rolls the snapshot back, another caller in a room of the same name
+finds nothing, expired and finished calls are not resumed, and concurrent
+writers with interleaved seqs leave the highest one behind.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from profile_schema import slots
+from session_snapshots import SessionSnapshotter, Snapshot, SnapshotStore, open_snapshot_store
+
+ROOM = "onboarding-room"
+CALLER = "caller-1"
+
+
+async def _handoff(store: SnapshotStore, failures: list[str]) -> None:
+    questionnaire = slots()
+    drained = SessionSnapshotter(store, ROOM, CALLER)
+    drained.update(questionnaire, 1, {questionnaire[0].key: "Priya"})
+    drained.update(questionnaire, 2, {questionnaire[0].key: "Priya", questionnaire[1].key: "Lisbon"})
+    await drained.aclose()
+
+    replacement = SessionSnapshotter(store, ROOM, CALLER)
+    snapshot = await replacement.restore(questionnaire)
+    if snapshot is None or snapshot.question_index != 2 or len(snapshot.collected_info) != 2:
+        failures.append(f"resume: expected question 2 with 2 answers, got {snapshot}")
+    replacement.update(questionnaire, 3, {**(snapshot.collected_info if snapshot else {}), questionnaire[2].key: "Pune"})
+    await replacement.aclose()
+
+    # the drained worker's write that was still in flight lands after the replacement's
+    drained.update(questionnaire, 2, {questionnaire[0].key: "Priya"})
+    await drained.aclose()
+    snapshot = await SessionSnapshotter(store, ROOM, CALLER).restore(questionnaire)
+    if snapshot is None or snapshot.question_index != 3:
+        failures.append(f"rollback: a late write replaced question 3 with {snapshot and snapshot.question_index}")
+
+    if await SessionSnapshotter(store, ROOM, "caller-2").restore(questionnaire) is not None:
+        failures.append("isolation: another caller in the same room resumed this call")
+    if await SessionSnapshotter(store, ROOM, CALLER, ttl=0).restore(questionnaire) is not None:
+        failures.append("ttl: an expired snapshot was resumed")
+
+    await SessionSnapshotter(store, ROOM, CALLER).aclose(finished=True)
+    if store.get(ROOM, CALLER) is not None:
+        failures.append("finish: the snapshot of a finished call was kept")
+
+
+def _concurrent_writes(store: SnapshotStore, writers: int, writes: int, failures: list[str]) -> float:
+    # every writer gets a share of the seqs, shuffled, so old seqs keep arriving after newer ones
+    seqs = list(range(1, writers * writes + 1))
+    random.Random(7).shuffle(seqs)
+    shares = [seqs[i::writers] for i in range(writers)]
+
+    def _write(share: list[int]) -> None:
+        for seq in share:
+            store.put(Snapshot(ROOM, CALLER, [], seq % 6, {}, seq=seq))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_write, args=(share,)) for share in shares]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    snapshot = store.get(ROOM, CALLER)
+    if snapshot is None or snapshot.seq != len(seqs):
+        failures.append(f"concurrent writes: expected seq {len(seqs)} to win, found {snapshot and snapshot.seq}")
+    store.delete(ROOM, CALLER)
+    return elapsed
+
+
+def main(args) -> list[str]:
+    failures: list[str] = []
+    with tempfile.TemporaryDirectory() as directory:
+        for path in (os.path.join(directory, "snapshots.db"), os.path.join(directory, "snapshots")):
+            store = open_snapshot_store(path)
+            name = type(store).__name__
+            before = len(failures)
+            asyncio.run(_handoff(store, failures))
+            elapsed = _concurrent_writes(store, args.writers, args.writes, failures)
+            writes = args.writers * args.writes
+            status = "ok" if len(failures) == before else "FAILED"
+            print(f"{name:20} {status:6} {writes} concurrent writes in {elapsed:.2f}s ({elapsed / writes * 1e6:.0f}us each)")
+            failures[before:] = [f"{name}: {failure}" for failure in failures[before:]]
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="writes per writer thread")
+    failures = main(parser.parse_args())
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
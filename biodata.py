@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any
+
+from livekit.agents import llm
+
+from profile_schema import PROFILE_SLOTS, _complete, extract_height
+
+logger = logging.getLogger("soul_agent")
+
+# Field -> type of the running profile; the six interview slots plus what people volunteer
+FIELDS: dict[str, type] = {
+    "name": str,
+    "age": int,
+    "gender": str,
+    "profession": str,
+    "education": str,
+    "hometown": str,
+    "dream_city": str,
+    "height": int,
+    "likes": list,
+    "dislikes": list,
+    "languages": list,
+}
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.S)
+
+_PROMPT = """Extract facts about the user from one answer in a matchmaking interview.
+Question: "{question}"
+Answer: "{answer}"
+Reply with only a JSON object holding the keys from this list that the answer states: {keys}.
+Height in centimeters, age in years, list fields as lists of short phrases. Reply {{}} if it states none."""
+
+
+def _list(value: Any) -> list[str]:
+    items = [value] if isinstance(value, str) else value if isinstance(value, list) else []
+    seen, result = set(), []
+    for item in items:
+        item = str(item).strip().lower()
+        if item and item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def _validate(key: str, value: Any) -> Any:
+    """The value in its field's type, or None if it isn't a plausible one."""
+    kind = FIELDS.get(key)
+    if kind is list:
+        return _list(value) or None
+    if key == "height":
+        if isinstance(value, str):
+            value = extract_height(value) or (int(value) if value.isdigit() else None)
+        return value if isinstance(value, int) and 120 <= value <= 230 else None
+    if key == "age":
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        return value if isinstance(value, int) and 18 <= value <= 100 else None
+    if isinstance(value, str):
+        value = value.strip()
+        return value if value and len(value) <= 80 else None
+    return None
+
+
+class IncrementalBiodata:
+    """Builds the user's biodata one answer at a time, in the background.
+
+    Every user message is parsed on its own (a constant-size prompt, not the
+    transcript so far) by a single worker task, and merged into the running
+    profile in order. Slot values the agent already extracted are kept over
+    what the LLM reads from the same answer. When the interview ends, finish()
+    only waits for the last message and validates.
+    """
+
+    def __init__(self, llm_engine: llm.LLM | None, max_pending: int = 16) -> None:
+        self.llm = llm_engine
+        self._slots: dict[str, Any] = {}
+        self._extracted: dict[str, Any] = {}
+        self._queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=max_pending)
+        self._worker_task: asyncio.Task | None = None
+
+    def confirm(self, key: str, value: Any) -> None:
+        self._slots[key] = value
+
+    def add_message(self, question: str | None, answer: str) -> None:
+        if self.llm is None or not answer.strip():
+            return
+        if self._worker_task is None:
+            self._worker_task = asyncio.create_task(self._worker(), name="biodata-extraction")
+        try:
+            self._queue.put_nowait((question or "(none, the user spoke freely)", answer))
+        except asyncio.QueueFull:
+            logger.warning("Biodata extraction is falling behind, skipping a message")
+
+    async def _worker(self) -> None:
+        while True:
+            question, answer = await self._queue.get()
+            try:
+                self._merge(await self._extract(question, answer))
+            except Exception as e:
+                logger.warning(f"Biodata extraction failed for one message: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _extract(self, question: str, answer: str) -> dict[str, Any]:
+        text = await _complete(self.llm, _PROMPT.format(question=question, answer=answer, keys=", ".join(FIELDS)))
+        match = _JSON_OBJECT.search(text)
+        if match is None:
+            return {}
+        data = json.loads(match.group(0))
+        return data if isinstance(data, dict) else {}
+
+    def _merge(self, data: dict[str, Any]) -> None:
+        for key, value in data.items():
+            if key not in FIELDS or value in (None, "", []):
+                continue
+            if FIELDS[key] is list:
+                self._extracted[key] = _list(self._extracted.get(key, [])) + _list(value)
+            else:
+                self._extracted[key] = value
+
+    async def finish(self, timeout: float = 10) -> dict[str, Any]:
+        """Wait for the pending messages and return the validated biodata."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Finishing biodata with {self._queue.qsize()} messages still unparsed")
+
+        biodata: dict[str, Any] = {}
+        for key in FIELDS:
+            slot_value = _validate(key, self._slots.get(key))
+            extracted = _validate(key, self._extracted.get(key))
+            if FIELDS[key] is list and slot_value and extracted:
+                biodata[key] = _list(slot_value + extracted)
+            elif slot_value is not None or extracted is not None:
+                biodata[key] = slot_value if slot_value is not None else extracted
+
+        missing = [key for key in PROFILE_SLOTS if key not in biodata]
+        if missing:
+            logger.info(f"Biodata is missing {', '.join(missing)}")
+        return biodata
+
+    async def aclose(self) -> None:
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            self._worker_task = None
@@ -0,0 +1,95 @@
+import logging
+import os
+from typing import Any, AsyncIterable
+
+from livekit.agents import llm
+
+logger = logging.getLogger("soul_agent")
+
+TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "1200"))
+KEEP_MESSAGES = int(os.getenv("LLM_CONTEXT_KEEP_MESSAGES", "4"))
+
+_PREFIX_ROLES = ("system", "developer")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English, plus the per-message framing
+    return len(text) // 4 + 4
+
+
+def _item_tokens(item: llm.ChatItem) -> int:
+    if isinstance(item, llm.ChatMessage):
+        return estimate_tokens(item.text_content or "")
+    return estimate_tokens(str(getattr(item, "arguments", "") or getattr(item, "output", "")))
+
+
+def _describe(value: Any) -> str:
+    return ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+
+
+class ContextWindow:
+    """Keeps the chat context sent to the LLM the same size on every turn.
+
+    The agent instructions are sent first and unchanged, so the provider can
+    reuse its cached prefix. Older turns are replaced by one message listing
+    the profile slots collected so far, and only the last few messages are
+    kept, within a token budget. Every request logs the estimated tokens sent
+    and, when the provider reports usage, the actual and cached prompt tokens.
+    """
+
+    def __init__(self, name: str, budget: int = TOKEN_BUDGET, keep_messages: int = KEEP_MESSAGES) -> None:
+        self.name = name
+        self.budget = budget
+        self.keep_messages = keep_messages
+        self.turn = 0
+
+    def trim(self, chat_ctx: llm.ChatContext, collected_info: dict[str, Any], pending: list[str]) -> llm.ChatContext:
+        items = chat_ctx.items
+        split = 0
+        while split < len(items) and isinstance(items[split], llm.ChatMessage) and items[split].role in _PREFIX_ROLES:
+            split += 1
+        prefix, history = items[:split], items[split:]
+        prefix_tokens = sum(_item_tokens(item) for item in prefix)
+
+        trimmed = llm.ChatContext(list(prefix))
+        profile_tokens = 0
+        if collected_info or pending:
+            lines = [f"- {key.replace('_', ' ')}: {_describe(value)}" for key, value in collected_info.items()]
+            summary = "Profile collected so far:\n" + ("\n".join(lines) or "- nothing yet")
+            if pending:
+                summary += f"\nStill to ask, in order: {', '.join(pending)}."
+            trimmed.add_message(role="system", content=summary)
+            profile_tokens = estimate_tokens(summary)
+
+        # newest first, the latest user message is always sent
+        budget = self.budget - prefix_tokens - profile_tokens
+        recent: list[llm.ChatItem] = []
+        history_tokens = 0
+        for item in reversed(history):
+            tokens = _item_tokens(item)
+            if recent and (len(recent) >= self.keep_messages or history_tokens + tokens > budget):
+                break
+            recent.append(item)
+            history_tokens += tokens
+        trimmed.items.extend(reversed(recent))
+
+        self.turn += 1
+        total = prefix_tokens + profile_tokens + history_tokens
+        logger.info(
+            f"[{self.name}] LLM turn {self.turn}: ~{total} tokens sent (instructions {prefix_tokens}, "
+            f"profile {profile_tokens}, {len(recent)} recent messages {history_tokens}, {len(history) - len(recent)} dropped)"
+        )
+        if total > self.budget:
+            logger.warning(f"[{self.name}] context over budget ({total} > {self.budget} tokens), the instructions alone are {prefix_tokens}")
+        return trimmed
+
+    async def track(self, stream: AsyncIterable[llm.ChatChunk | str]) -> AsyncIterable[llm.ChatChunk | str]:
+        """Pass the LLM stream through, logging the prompt tokens the provider reports."""
+        async for chunk in stream:
+            if isinstance(chunk, llm.ChatChunk) and chunk.usage is not None:
+                usage = chunk.usage
+                logger.info(
+                    f"[{self.name}] LLM turn {self.turn}: {usage.prompt_tokens} prompt tokens "
+                    f"({usage.prompt_cached_tokens} cached), {usage.completion_tokens} completion tokens"
+                )
+            yield chunk
@@ -0,0 +1,256 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("soul_agent")
+
+DEFAULT_LOG_DIR = os.getenv("CONVERSATION_LOG_DIR", "conversation_logs")
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+BATCH_SIZE = 32
+FLUSH_INTERVAL = 2.0
+FSYNC_INTERVAL = 5.0
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    sealed INTEGER NOT NULL DEFAULT 0
+);
+-- one row per batch line, in the order they were appended by every process
+CREATE TABLE IF NOT EXISTS batches (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    UNIQUE (segment, offset)
+);
+CREATE INDEX IF NOT EXISTS batches_session ON batches (user_id, session_id);
+"""
+
+
+class _Segment:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = open(path, "ab")
+        # the lock marks the segment as live, recovery leaves locked segments alone
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.size = self.file.tell()
+
+    def append(self, line: bytes) -> tuple[int, int]:
+        offset = self.size
+        self.file.write(line)
+        self.file.flush()
+        self.size += len(line)
+        return offset, len(line)
+
+    def close(self) -> None:
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class ConversationLog:
+    """Append-only, segmented JSONL store for conversation transcripts.
+
+    Every line of a segment is one batch of messages from one session. The
+    byte range of each batch is recorded in a SQLite index next to the
+    segments as soon as the line is written, so every process on the host
+    finds a session's batches, including those of one still being written,
+    with an index query instead of a scan of every segment.
+
+    Connections are per thread; call it from a worker thread, not the event loop.
+    """
+
+    def __init__(self, directory: str = DEFAULT_LOG_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 fsync_interval: float = FSYNC_INTERVAL) -> None:
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._segment: _Segment | None = None
+        self._segment_seq = 0
+        self._open_sessions = 0
+        self._last_fsync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        self._recover()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # the segments are the record, a lost index row is rebuilt by replaying them
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _recover(self) -> None:
+        sealed = {name for (name,) in self._connect().execute("SELECT name FROM segments WHERE sealed")}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.jsonl"))):
+            if os.path.basename(path) not in sealed:
+                self._replay(path)
+
+    def _replay(self, path: str) -> None:
+        with open(path, "r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # still being written by a live process
+
+            # The writer died before sealing: index every complete batch and cut
+            # off a trailing batch that was only partially written.
+            rows = []
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                rows.append((batch["user_id"], batch["session_id"], os.path.basename(path), offset, len(line)))
+                offset += len(line)
+
+            if offset < os.fstat(f.fileno()).st_size:
+                logger.warning(f"Truncating partial batch at byte {offset} of {path}")
+                f.truncate(offset)
+            os.fsync(f.fileno())
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO batches (user_id, session_id, segment, offset, length) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._mark_sealed(conn, os.path.basename(path))
+
+    @staticmethod
+    def _mark_sealed(conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO segments (name, sealed) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET sealed = 1", (name,)
+        )
+
+    def _seal(self) -> None:
+        # under self._lock
+        if self._segment is None:
+            return
+        self._segment.close()
+        with self._connect() as conn:
+            self._mark_sealed(conn, self._segment.name)
+        self._segment = None
+
+    def _active_segment(self) -> _Segment:
+        if self._segment is not None and self._segment.size >= self.segment_max_bytes:
+            self._seal()
+        if self._segment is None:
+            self._segment_seq += 1
+            name = f"{int(time.time() * 1000)}-{os.getpid()}-{self._segment_seq:04d}.jsonl"
+            self._segment = _Segment(os.path.join(self.directory, name))
+        return self._segment
+
+    def append_batch(self, user_id: str, session_id: str, messages: list[dict]) -> None:
+        if not messages:
+            return
+        line = json.dumps(
+            {"user_id": user_id, "session_id": session_id, "messages": messages}, ensure_ascii=False
+        ).encode() + b"\n"
+        with self._lock:
+            segment = self._active_segment()
+            offset, length = segment.append(line)
+            # the line is in the file before its row is visible, readers never see half a batch
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO batches (user_id, session_id, segment, offset, length) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, session_id, segment.name, offset, length),
+                )
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(segment.file.fileno())
+                self._last_fsync = time.monotonic()
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._segment is not None:
+                os.fsync(self._segment.file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def session(self, user_id: str, session_id: str) -> "SessionLog":
+        with self._lock:
+            self._open_sessions += 1
+        return SessionLog(self, user_id, session_id)
+
+    def release(self) -> None:
+        """A session is done: seal the segment once no session of this process is writing to it."""
+        with self._lock:
+            self._open_sessions -= 1
+            if self._open_sessions > 0:
+                if self._segment is not None:
+                    os.fsync(self._segment.file.fileno())
+                self._last_fsync = time.monotonic()
+                return
+            # job processes exit after the call, the segment must not be left open
+            self._seal()
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal()
+
+
+class SessionLog:
+    def __init__(self, log: ConversationLog, user_id: str, session_id: str, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.log = log
+        self.user_id = user_id
+        self.session_id = session_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def append(self, role: str, content) -> None:
+        if isinstance(content, list):
+            content = " ".join(str(part) for part in content)
+        self._buffer.append({"role": role, "content": content, "ts": time.time()})
+        if len(self._buffer) >= self.batch_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if batch:
+                await asyncio.to_thread(self.log.append_batch, self.user_id, self.session_id, batch)
+
+    async def aclose(self) -> None:
+        await self.flush()
+        await asyncio.to_thread(self.log.release)
+
+
+_conversation_log: ConversationLog | None = None
+_conversation_log_lock = threading.Lock()
+
+
+def get_conversation_log() -> ConversationLog:
+    # Opened at prewarm so replaying a crashed segment happens in the worker, not at import or on a job's loop
+    global _conversation_log
+    with _conversation_log_lock:
+        if _conversation_log is None:
+            _conversation_log = ConversationLog()
+    return _conversation_log
@@ -0,0 +1,224 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from livekit.agents import AgentSession
+
+from profile_schema import Slot
+
+logger = logging.getLogger("soul_agent")
+
+# answer shape -> (min delay, max delay, expected words), delays in seconds after the end of speech
+SHAPES = {
+    "short": (0.3, 1.5, 3),
+    "long": (0.9, 4.0, 12),
+}
+# how far the min delay may be tuned away from the shape's default
+MIN_DELAY_RANGE = (0.5, 2.5)
+TARGET_CUTOFF_RATE = float(os.getenv("ENDPOINTING_TARGET_CUTOFF_RATE", "0.05"))
+# the user speaking again this soon after their turn was committed means they were cut off
+CUTOFF_WINDOW = float(os.getenv("ENDPOINTING_CUTOFF_WINDOW", "1.5"))
+ALPHA = 0.1
+# Job processes exit after each call, the tuning is carried over in a host-wide file merged on save
+STATS_PATH = os.getenv("ENDPOINTING_STATS_PATH", os.path.join(tempfile.gettempdir(), "soul_endpointing.json"))
+_TUNED = ("min_delay", "max_delay", "answers", "cutoff_rate", "words")
+
+
+@dataclass
+class _SlotPolicy:
+    min_delay: float
+    max_delay: float
+    base_min: float
+    base_max: float
+    expected_words: float
+    answers: int = 0
+    cutoff_rate: float = 0.0
+    words: float = 0.0
+
+
+class EndpointingPolicy:
+    """Per-slot endpointing delays for the process, tuned from how people actually answer.
+
+    Each slot starts from the delays of its answer shape, so "How tall are
+    you?" ends the turn quickly and "What are some things you like?" waits
+    through hesitation. Every answer updates the slot's cut-off rate (the user
+    went on talking right after the turn was taken) and its length in words:
+    the min delay grows while cut-offs are above target and slowly shrinks
+    below it, and the max delay follows the answer length.
+
+    The tuned values are loaded in prewarm and saved when a job shuts down;
+    answers other processes observed since the load are merged in, weighted
+    by how many each side saw.
+    """
+
+    def __init__(self, path: str = STATS_PATH) -> None:
+        self.path = path
+        self._slots: dict[str, _SlotPolicy] = {}
+        # tuned values read from the file, applied when the slot is first asked
+        self._saved: dict[str, dict] = {}
+        # answers per slot already in the file, the rest were observed here
+        self._saved_answers: dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _policy(self, slot: Slot) -> _SlotPolicy:
+        policy = self._slots.get(slot.key)
+        if policy is None:
+            min_delay, max_delay, words = SHAPES.get(slot.answer_shape, SHAPES["short"])
+            policy = self._slots[slot.key] = _SlotPolicy(min_delay, max_delay, min_delay, max_delay, words, words=words)
+            for name, value in self._saved.get(slot.key, {}).items():
+                setattr(policy, name, value)
+        return policy
+
+    def delays(self, slot: Slot) -> tuple[float, float]:
+        with self._lock:
+            policy = self._policy(slot)
+            return policy.min_delay, policy.max_delay
+
+    def observe(self, slot: Slot, words: int, cut_off: bool) -> None:
+        with self._lock:
+            policy = self._policy(slot)
+            policy.answers += 1
+            self._dirty = True
+            policy.cutoff_rate += ALPHA * ((1.0 if cut_off else 0.0) - policy.cutoff_rate)
+            policy.words += ALPHA * (words - policy.words)
+
+            low, high = MIN_DELAY_RANGE
+            step = 1.15 if policy.cutoff_rate > TARGET_CUTOFF_RATE else 0.98
+            policy.min_delay = min(max(policy.min_delay * step, policy.base_min * low), policy.base_min * high)
+            scale = min(max(policy.words / policy.expected_words, 0.5), 2.0)
+            policy.max_delay = max(policy.base_max * scale, policy.min_delay + 0.5)
+
+        if cut_off or policy.answers % 20 == 0:
+            logger.info(
+                f"Endpointing for {slot.key}: min {policy.min_delay:.2f}s, max {policy.max_delay:.2f}s "
+                f"({policy.cutoff_rate:.0%} cut off, ~{policy.words:.0f} words over {policy.answers} answers)"
+            )
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {key: vars(policy).copy() for key, policy in self._slots.items()}
+
+    def _read(self) -> dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                raw = json.load(f)["slots"]
+            return {
+                key: {name: int(value[name]) if name == "answers" else float(value[name]) for name in _TUNED}
+                for key, value in raw.items()
+            }
+        except FileNotFoundError:
+            return {}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable endpointing stats {self.path}: {e}")
+            return {}
+
+    def load(self) -> None:
+        saved = self._read()
+        with self._lock:
+            self._saved = saved
+            self._saved_answers = {key: value["answers"] for key, value in saved.items()}
+            for key, policy in self._slots.items():
+                for name, value in saved.get(key, {}).items():
+                    setattr(policy, name, value)
+        logger.info(f"Loaded endpointing stats for {len(saved)} slots from {self.path}")
+
+    async def flush(self, *_) -> None:
+        await asyncio.to_thread(self.save)
+
+    def save(self) -> None:
+        """Merge with what other processes saved and write the file back atomically."""
+        if not self._dirty:
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            on_disk = self._read()
+            with self._lock:
+                for key, policy in self._slots.items():
+                    theirs = on_disk.get(key)
+                    base = self._saved_answers.get(key, 0)
+                    ours_new = policy.answers - base
+                    theirs_new = theirs["answers"] - base if theirs is not None else 0
+                    if theirs is not None and theirs_new > 0 and ours_new > 0:
+                        # both sides tuned from the same base, blend by how many answers each saw
+                        weight = ours_new / (ours_new + theirs_new)
+                        for name in ("min_delay", "max_delay", "cutoff_rate", "words"):
+                            setattr(policy, name, theirs[name] + weight * (getattr(policy, name) - theirs[name]))
+                        policy.answers = theirs["answers"] + ours_new
+                    elif theirs is not None and ours_new <= 0:
+                        # nothing new here, take the newer values from the file
+                        for name, value in theirs.items():
+                            setattr(policy, name, value)
+                    on_disk[key] = {name: getattr(policy, name) for name in _TUNED}
+                    self._saved_answers[key] = policy.answers
+                self._saved = on_disk
+                self._dirty = False
+            directory = os.path.dirname(self.path) or "."
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".endpointing-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"slots": on_disk}, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+
+endpointing_policy = EndpointingPolicy()
+
+
+class AdaptiveEndpointing:
+    """Applies the policy's delays for the slot being asked to one session and reports its answers back."""
+
+    def __init__(self, session: AgentSession, policy: EndpointingPolicy = endpointing_policy) -> None:
+        self._session = session
+        self._policy = policy
+        self._slot: Slot | None = None
+        self._words = 0
+        # the answer whose turn was just taken, until we know whether it was cut off
+        self._committed: tuple[Slot, int] | None = None
+        self._committed_at = 0.0
+        session.on("user_input_transcribed", self._on_user_input_transcribed)
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+
+    def expect(self, slot: Slot | None) -> None:
+        """Set the slot the user's next answer is for."""
+        self._slot = slot
+        self._words = 0
+        if slot is None:
+            return
+        min_delay, max_delay = self._policy.delays(slot)
+        self._session.update_options(endpointing_opts={"min_delay": min_delay, "max_delay": max_delay})
+
+    def _on_user_input_transcribed(self, ev) -> None:
+        if ev.is_final:
+            self._words += len(ev.transcript.split())
+
+    def _on_agent_state_changed(self, ev) -> None:
+        if ev.new_state == "thinking" and self._slot is not None and self._words:
+            self._settle()
+            self._committed = (self._slot, self._words)
+            self._committed_at = time.monotonic()
+
+    def _on_user_state_changed(self, ev) -> None:
+        if ev.new_state == "speaking" and self._committed is not None:
+            self._settle(cut_off=time.monotonic() - self._committed_at < CUTOFF_WINDOW)
+
+    def _settle(self, cut_off: bool = False) -> None:
+        if self._committed is not None:
+            slot, words = self._committed
+            self._committed = None
+            self._policy.observe(slot, words, cut_off)
+
+    def close(self) -> None:
+        self._settle()
+        self._session.off("user_input_transcribed", self._on_user_input_transcribed)
+        self._session.off("user_state_changed", self._on_user_state_changed)
+        self._session.off("agent_state_changed", self._on_agent_state_changed)
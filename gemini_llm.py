@@ -0,0 +1,122 @@
+import logging
+import os
+import re
+from typing import AsyncIterable, AsyncIterator
+
+import google.generativeai as genai
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectionError,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    utils,
+)
+
+logger = logging.getLogger("transcriber")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _to_gemini(chat_ctx: llm.ChatContext) -> tuple[str | None, list[dict]]:
+    system_parts = []
+    contents = []
+    for item in chat_ctx.items:
+        if item.type != "message" or not item.text_content:
+            continue
+        if item.role in ("system", "developer"):
+            system_parts.append(item.text_content)
+            continue
+        role = "model" if item.role == "assistant" else "user"
+        # Gemini rejects two turns in a row from the same role
+        if contents and contents[-1]["role"] == role:
+            contents[-1]["parts"].append(item.text_content)
+        else:
+            contents.append({"role": role, "parts": [item.text_content]})
+    return "\n".join(system_parts) or None, contents
+
+
+class GeminiLLM(llm.LLM):
+    def __init__(self, *, model: str = "gemini-2.0-flash", api_key: str | None = None,
+                 temperature: float | None = None) -> None:
+        super().__init__()
+        self._model = model
+        self._temperature = temperature
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "google"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict] = NOT_GIVEN,
+    ) -> "GeminiLLMStream":
+        # Tool calling is not wired up, the agents using Gemini only need text
+        return GeminiLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class GeminiLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        gemini: GeminiLLM = self._llm
+        system_instruction, contents = _to_gemini(self._chat_ctx)
+        model = genai.GenerativeModel(gemini.model, system_instruction=system_instruction)
+        config = genai.GenerationConfig(temperature=gemini._temperature) if gemini._temperature is not None else None
+        request_id = utils.shortuuid()
+
+        try:
+            response = await model.generate_content_async(
+                contents,
+                stream=True,
+                generation_config=config,
+                request_options={"timeout": self._conn_options.timeout},
+            )
+            async for chunk in response:
+                for candidate in chunk.candidates:
+                    for part in candidate.content.parts:
+                        if part.text:
+                            self._event_ch.send_nowait(
+                                llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=part.text))
+                            )
+        except Exception as e:
+            raise APIConnectionError(f"gemini request failed: {e}") from e
+
+
+async def sentence_chunks(stream: AsyncIterable[llm.ChatChunk], min_chars: int = 20) -> AsyncIterator[str]:
+    """Regroup a token stream into sentence-sized pieces for TTS.
+
+    Closing the generator (what AgentSession does when the user barges in)
+    closes the LLM stream, which cancels the in-flight request.
+    """
+    pending = ""
+    try:
+        async for chunk in stream:
+            if chunk.delta is None or not chunk.delta.content:
+                continue
+            pending += chunk.delta.content
+            parts = _SENTENCE_END.split(pending)
+            complete, pending = parts[:-1], parts[-1]
+            sentence = ""
+            for part in complete:
+                sentence = f"{sentence} {part}" if sentence else part
+                if len(sentence) >= min_chars:
+                    yield sentence + " "
+                    sentence = ""
+            if sentence:
+                pending = f"{sentence} {pending}"
+        if pending.strip():
+            yield pending
+    finally:
+        if isinstance(stream, llm.LLMStream):
+            await stream.aclose()
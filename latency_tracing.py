@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from livekit.agents import AgentSession, metrics
+
+logger = logging.getLogger("soul_agent")
+
+TRACE_DIR = os.getenv("LATENCY_TRACE_DIR", "latency_traces")
+DUMP_INTERVAL = float(os.getenv("LATENCY_DUMP_INTERVAL", "60"))
+
+# Stages in the order they happen, all measured from the VAD end of speech
+STAGES = ("stt_final", "end_of_turn", "llm_first_token", "tts_first_byte", "first_audio")
+
+# Histogram bucket upper bounds in ms, the last bucket catches everything above
+BUCKETS_MS = (25, 50, 75, 100, 150, 200, 300, 400, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+
+@dataclass
+class TurnTrace:
+    room: str
+    agent: str
+    speech_ended_at: float
+    stages: dict[str, float] = field(default_factory=dict)
+
+    def record(self, stage: str, at: float) -> None:
+        # only the first occurrence counts, later ones are follow-up speech in the same turn
+        if stage not in self.stages:
+            self.stages[stage] = max(0.0, (at - self.speech_ended_at) * 1000)
+
+
+def _percentile(values: list[float], p: float) -> float:
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class TraceBuffer:
+    """Completed turns of every session in this process, kept in a fixed-size ring."""
+
+    def __init__(self, maxlen: int = 4096) -> None:
+        self._turns: deque[TurnTrace] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._dumper: threading.Thread | None = None
+
+    def add(self, turn: TurnTrace) -> None:
+        with self._lock:
+            self._turns.append(turn)
+
+    def snapshot(self) -> list[TurnTrace]:
+        with self._lock:
+            return list(self._turns)
+
+    def summary(self) -> dict[str, dict]:
+        by_stage: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        for turn in self.snapshot():
+            for stage, ms in turn.stages.items():
+                by_stage[stage].append(ms)
+
+        summary = {}
+        for stage, values in by_stage.items():
+            if not values:
+                continue
+            values.sort()
+            histogram = [0] * (len(BUCKETS_MS) + 1)
+            for ms in values:
+                histogram[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            summary[stage] = {
+                "count": len(values),
+                "p50": round(_percentile(values, 50), 1),
+                "p95": round(_percentile(values, 95), 1),
+                "p99": round(_percentile(values, 99), 1),
+                "max": round(values[-1], 1),
+                "histogram": histogram,
+            }
+        return summary
+
+    def dump(self, directory: str = TRACE_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"latency-{os.getpid()}.json")
+        report = {"generated_at": time.time(), "buckets_ms": BUCKETS_MS, "stages": self.summary()}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def start_periodic_dump(self, interval: float = DUMP_INTERVAL) -> None:
+        # A daemon thread, so the summary and file write never run on a session's event loop
+        if self._dumper is not None and self._dumper.is_alive():
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump()
+                except Exception as e:
+                    logger.warning(f"Could not write latency histogram: {e}")
+
+        self._dumper = threading.Thread(target=_run, name="latency-dump", daemon=True)
+        self._dumper.start()
+
+
+traces = TraceBuffer()
+
+
+class LatencyTracer:
+    """Per-turn latency of one session, from the moment the user stops speaking.
+
+    Everything comes from AgentSession events and metrics, so the agents don't
+    need to be touched: VAD end of speech, final transcript, end-of-turn
+    decision (EOU metrics), LLM first token, TTS first byte, and the agent
+    starting to speak (first audio frame published). A turn is closed when the
+    agent stops speaking or the user starts the next one.
+
+    The periodic dump misses calls shorter than its interval and the tail of
+    every job, so register aclose() as a job shutdown callback.
+    """
+
+    def __init__(self, session: AgentSession, room: str, agent: str) -> None:
+        self.room = room
+        self.agent = agent
+        self._turn: TurnTrace | None = None
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("user_input_transcribed", self._on_user_input_transcribed)
+        session.on("metrics_collected", self._on_metrics_collected)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+        traces.start_periodic_dump()
+
+    def _on_user_state_changed(self, ev) -> None:
+        if ev.new_state == "speaking":
+            self._finish()
+        elif ev.old_state == "speaking":
+            self._turn = TurnTrace(self.room, self.agent, ev.created_at)
+
+    def _on_user_input_transcribed(self, ev) -> None:
+        if self._turn is not None and ev.is_final:
+            self._turn.record("stt_final", ev.created_at)
+
+    def _on_metrics_collected(self, ev) -> None:
+        turn = self._turn
+        m = ev.metrics
+        if turn is None:
+            return
+        if isinstance(m, metrics.EOUMetrics):
+            turn.record("end_of_turn", turn.speech_ended_at + m.end_of_utterance_delay)
+        elif isinstance(m, metrics.LLMMetrics) and m.ttft >= 0:
+            # metrics are emitted when the request finishes, work back to its start
+            turn.record("llm_first_token", m.timestamp - m.duration + m.ttft)
+        elif isinstance(m, metrics.TTSMetrics) and m.ttfb >= 0:
+            turn.record("tts_first_byte", m.timestamp - m.duration + m.ttfb)
+
+    def _on_agent_state_changed(self, ev) -> None:
+        if self._turn is None:
+            return
+        if ev.new_state == "speaking":
+            self._turn.record("first_audio", ev.created_at)
+        elif ev.old_state == "speaking":
+            # LLM and TTS metrics arrive once their request completes, which is after playout started
+            self._finish()
+
+    def _finish(self) -> None:
+        turn, self._turn = self._turn, None
+        if turn is not None and turn.stages:
+            traces.add(turn)
+            logger.debug(f"[{self.room}] turn latency: " + ", ".join(f"{k} {v:.0f}ms" for k, v in turn.stages.items()))
+
+    async def aclose(self, *_) -> None:
+        """Close the open turn and write the process's histogram once more before the job exits."""
+        self._finish()
+        try:
+            await asyncio.to_thread(traces.dump)
+        except Exception as e:
+            logger.warning(f"[{self.room}] could not write latency histogram: {e}")
@@ -0,0 +1,390 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    utils,
+)
+
+from profile_schema import PROFILE_SLOTS, Slot
+
+logger = logging.getLogger("soul_agent")
+
+# Lives outside the worker's working dir so every process on the host shares it
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "soul_llm_cache.json"))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 60 * 60))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+POOL_SIZE = int(os.getenv("LLM_CACHE_POOL_SIZE", 5))
+SAVE_INTERVAL = 30.0
+REPORT_EVERY = 50
+
+VALUE = "{value}"
+
+# Which slot the agent's last question was about, when it is not one of our own phrasings
+_SLOT_HINTS = (
+    ("dream_city", re.compile(r"\bdream city\b|\blive anywhere\b|\blove to live\b", re.I)),
+    ("hometown", re.compile(r"\bhometown\b|\bgrow up\b|\bgrew up\b|\bfrom\?", re.I)),
+    ("dislikes", re.compile(r"\bdislike|\bcan't stand\b|\bpet peeve", re.I)),
+    ("likes", re.compile(r"\blike\b|\benjoy\b|\bhobbies\b", re.I)),
+    ("height", re.compile(r"\bheight\b|\bhow tall\b", re.I)),
+    ("name", re.compile(r"\bname\b|\bcall you\b", re.I)),
+)
+_DECLINED = re.compile(r"\b(?:don't know|do not know|not sure|no idea|skip|pass|rather not)\b", re.I)
+_PERSONAL = re.compile(r"[a-z]{4,}|\S*\d\S*", re.I)
+_COMMON = {"from", "like", "love", "really", "that", "this", "with", "what", "your", "have", "about", "things",
+           "would", "live", "city", "name", "call", "tall", "feet", "foot", "inches", "there", "just", "well"}
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_CAPITALIZED = re.compile(r"\b[A-Z][a-z]+\b")
+# ContextWindow's "Profile collected so far" lines, "- slot name: value"
+_PROFILE_LINE = re.compile(r"^(- [^:\n]+):(.*)$", re.M)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _slot_for(question: str) -> Slot | None:
+    normalized = _normalize(question)
+    for slot in PROFILE_SLOTS.values():
+        if any(_normalize(variant) in normalized for variant in slot.all_variants()):
+            return slot
+    for key, hint in _SLOT_HINTS:
+        if hint.search(question):
+            return PROFILE_SLOTS[key]
+    return None
+
+
+@dataclass
+class _Turn:
+    """What a request is about: the key it is cached under and the value to put back in."""
+    key: str
+    value: str
+    # words of the caller's (this answer, earlier answers, the profile summary), a reply saying one is not shared
+    personal: frozenset[str]
+    # capitalized words the instructions use, the agent's own name among them
+    known_names: frozenset[str]
+
+
+def _personal_words(text: str) -> set[str]:
+    return {word.lower() for word in _PERSONAL.findall(text)} - _COMMON
+
+
+def _turn(chat_ctx: llm.ChatContext) -> _Turn | None:
+    messages = [item for item in chat_ctx.items if isinstance(item, llm.ChatMessage)]
+    if len(messages) < 3 or messages[-1].role != "user":
+        return None
+    # the instructions are the first message, ContextWindow keeps them there unchanged
+    if messages[0].role not in ("system", "developer"):
+        return None
+    question = next((m.text_content for m in reversed(messages[:-1]) if m.role == "assistant"), None)
+    slot = _slot_for(question) if question else None
+    if slot is None:
+        return None
+
+    # only answer classes whose reply doesn't depend on what exactly was said, once the value is templated out
+    answer = messages[-1].text_content or ""
+    value = slot.extract(answer)
+    if value is not None:
+        answer_class, text = "given", slot.describe(value) if not isinstance(value, str) else value
+    elif _DECLINED.search(answer):
+        answer_class, text = "declined", ""
+    else:
+        return None
+
+    # the profile summary is keyed without its values: which slots are filled and still to ask shapes the reply
+    context = ""
+    personal = set()
+    for message in messages[1:-1]:
+        content = message.text_content or ""
+        if message.role in ("system", "developer"):
+            context += _PROFILE_LINE.sub(r"\1", content)
+            personal |= {word for value in _PROFILE_LINE.findall(content) for word in _personal_words(value[1])}
+        elif message.role == "user":
+            personal |= _personal_words(content)
+    personal |= _personal_words(answer)
+
+    instructions = messages[0].text_content or ""
+    prefix = hashlib.sha256(_normalize(instructions + "\n" + context).encode()).hexdigest()[:16]
+    return _Turn(key=f"{prefix}:{slot.key}:{answer_class}", value=text, personal=frozenset(personal),
+                 known_names=frozenset(_CAPITALIZED.findall(instructions)))
+
+
+def _names(response: str) -> set[str]:
+    # capitalized words past the start of a sentence, proper nouns as far as a reply goes
+    names = set()
+    for sentence in _SENTENCE.split(response):
+        names.update(_CAPITALIZED.findall(sentence)[1 if _CAPITALIZED.match(sentence.lstrip("\"'")) else 0:])
+    return names
+
+
+def _template(response: str, turn: _Turn) -> str | None:
+    """The response with the user's value replaced by VALUE, or None if it says anything else of theirs.
+
+    The cache is shared by every caller on the host, so a reply that still
+    names anything a caller said, in this turn or an earlier one, or any
+    proper noun the instructions don't use, is never stored.
+    """
+    if VALUE in response:
+        return None
+    if turn.value:
+        # whole words only, a short value must not template out the inside of another word
+        response = re.sub(rf"(?<!\w){re.escape(turn.value)}(?!\w)", VALUE, response, flags=re.I)
+    if _personal_words(response) & turn.personal:
+        return None
+    if _names(response) - turn.known_names:
+        return None
+    return response
+
+
+@dataclass
+class _Entry:
+    variants: list[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    used_at: float = field(default_factory=time.time)
+
+
+class ResponseCache:
+    """Replies to the onboarding turns that come up in every call, with the user's value templated out.
+
+    Keyed on the agent instructions, the slot being answered and a coarse
+    answer class. Each key holds a pool of up to `pool_size` phrasings, so
+    hits don't always sound the same; the pool fills from the LLM's own
+    replies and a request is served from it more often the fuller it is.
+    Entries are evicted least recently used and after `ttl`, and the cache
+    is persisted in a host-wide JSON file that is merged on save.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 pool_size: int = POOL_SIZE) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pool_size = pool_size
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._save_handle: asyncio.TimerHandle | None = None
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stored = 0
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def _read(self) -> dict[str, _Entry]:
+        try:
+            with open(self.path) as f:
+                raw = json.load(f)["entries"]
+            return {key: _Entry(**value) for key, value in raw.items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable LLM response cache {self.path}: {e}")
+            return {}
+
+    def load(self) -> None:
+        entries = self._read()
+        now = time.time()
+        with self._lock:
+            for key, entry in sorted(entries.items(), key=lambda item: item[1].used_at):
+                if not self._expired(entry, now):
+                    self._entries[key] = entry
+            self._evict()
+            self._loaded = True
+        logger.info(f"Loaded {len(self._entries)} cached LLM responses from {self.path}")
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, turn: _Turn | None) -> str | None:
+        if not self._loaded:
+            self.load()
+        if turn is None:
+            self.bypassed += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(turn.key)
+            if entry is not None and self._expired(entry, time.time()):
+                del self._entries[turn.key]
+                entry = None
+            # while the pool is filling, some requests still go to the LLM for new phrasings
+            if entry is None or random.random() >= len(entry.variants) / self.pool_size:
+                self.misses += 1
+                variant = None
+            else:
+                self.hits += 1
+                entry.used_at = time.time()
+                self._entries.move_to_end(turn.key)
+                variant = random.choice(entry.variants)
+        self._report()
+        return variant.replace(VALUE, turn.value) if variant is not None else None
+
+    def store(self, turn: _Turn, response: str) -> None:
+        template = _template(response.strip(), turn)
+        if not template:
+            return
+        with self._lock:
+            entry = self._entries.setdefault(turn.key, _Entry())
+            self._entries.move_to_end(turn.key)
+            if template in entry.variants or len(entry.variants) >= self.pool_size:
+                return
+            entry.variants.append(template)
+            self._evict()
+            self.stored += 1
+            self._dirty = True
+        self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        if self._save_handle is None:
+            loop = asyncio.get_running_loop()
+            self._save_handle = loop.call_later(SAVE_INTERVAL, lambda: loop.create_task(self._save_later()))
+
+    async def _save_later(self) -> None:
+        self._save_handle = None
+        await asyncio.to_thread(self.save)
+
+    async def flush(self) -> None:
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        await asyncio.to_thread(self.save)
+
+    def save(self) -> None:
+        """Merge with what other processes saved and write the file back atomically."""
+        if not self._dirty:
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            on_disk = self._read()
+            with self._lock:
+                for key, theirs in on_disk.items():
+                    ours = self._entries.get(key)
+                    if ours is None:
+                        continue
+                    for variant in theirs.variants:
+                        if variant not in ours.variants and len(ours.variants) < self.pool_size:
+                            ours.variants.append(variant)
+                    ours.created_at = min(ours.created_at, theirs.created_at)
+                merged = {**on_disk, **self._entries}
+                self._dirty = False
+            now = time.time()
+            entries = sorted(((k, e) for k, e in merged.items() if not self._expired(e, now)), key=lambda item: item[1].used_at)
+            data = {"entries": {key: vars(entry) for key, entry in entries[-self.max_entries:]}}
+            directory = os.path.dirname(self.path) or "."
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".llm-cache-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stored": self.stored,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _report(self) -> None:
+        lookups = self.hits + self.misses
+        if lookups and lookups % REPORT_EVERY == 0:
+            stats = self.stats()
+            logger.info(
+                f"LLM response cache: {stats['hit_rate']:.0%} hits ({self.hits}/{lookups}), "
+                f"{self.bypassed} uncacheable, {stats['entries']} entries"
+            )
+
+
+response_cache = ResponseCache()
+
+
+class CachedLLM(llm.LLM):
+    """Serves repeated onboarding turns from `response_cache`, everything else goes to `inner`.
+
+    The wrapped LLM is not closed with this one, it belongs to the entrypoint that built it.
+    """
+
+    def __init__(self, inner: llm.LLM, cache: ResponseCache = response_cache) -> None:
+        super().__init__()
+        self.inner = inner
+        self.cache = cache
+
+    @property
+    def model(self) -> str:
+        return self.inner.model
+
+    @property
+    def provider(self) -> str:
+        return self.inner.provider
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict] = NOT_GIVEN,
+    ) -> llm.LLMStream:
+        if tools:
+            return self.inner.chat(chat_ctx=chat_ctx, tools=tools, conn_options=conn_options,
+                                   parallel_tool_calls=parallel_tool_calls, tool_choice=tool_choice, extra_kwargs=extra_kwargs)
+        turn = _turn(chat_ctx)
+        cached = self.cache.lookup(turn)
+        # the wrapped stream does the retrying
+        outer_options = replace(conn_options, max_retry=0)
+        return _CachedLLMStream(self, chat_ctx=chat_ctx, tools=[], conn_options=outer_options, turn=turn, cached=cached,
+                                inner_options=conn_options)
+
+
+class _CachedLLMStream(llm.LLMStream):
+    def __init__(self, cached_llm: CachedLLM, *, chat_ctx: llm.ChatContext, tools: list, conn_options: APIConnectOptions,
+                 turn: _Turn | None, cached: str | None, inner_options: APIConnectOptions) -> None:
+        super().__init__(cached_llm, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._turn = turn
+        self._cached = cached
+        self._inner_options = inner_options
+
+    async def _run(self) -> None:
+        request_id = utils.shortuuid()
+        if self._cached is not None:
+            # one chunk per sentence so TTS can start on the first one
+            for sentence in _SENTENCE.split(self._cached):
+                self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=sentence + " ")))
+            return
+
+        cached_llm: CachedLLM = self._llm
+        text = ""
+        async with cached_llm.inner.chat(chat_ctx=self._chat_ctx, conn_options=self._inner_options) as stream:
+            async for chunk in stream:
+                if chunk.delta is not None and chunk.delta.content:
+                    text += chunk.delta.content
+                self._event_ch.send_nowait(chunk)
+        # only replies that finished are worth replaying
+        if self._turn is not None and text:
+            cached_llm.cache.store(self._turn, text)
@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter, deque
+from dataclasses import dataclass
+
+logger = logging.getLogger("soul_agent")
+
+STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100")) / 1000
+HEARTBEAT_INTERVAL = 0.05
+REPORT_INTERVAL = 60.0
+
+_room: contextvars.ContextVar[str | None] = contextvars.ContextVar("loop_watchdog_room", default=None)
+
+
+@dataclass
+class Stall:
+    room: str
+    location: str
+    stack: list[str]
+    duration_ms: float = 0.0
+
+
+@dataclass
+class _Offender:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    stack: list[str] | None = None
+
+
+def _location(stack: traceback.StackSummary) -> str:
+    # the innermost frame outside the stdlib and site-packages is the code to fix
+    for frame in reversed(stack):
+        if "site-packages" not in frame.filename and not frame.filename.startswith(sys.prefix):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and catches callbacks that block the loop.
+
+    A heartbeat callback on the loop records how late it runs. A separate
+    thread polls the heartbeat; once it is more than `threshold` behind, the
+    loop thread's stack is captured while it is still stuck, and attributed to
+    the room of the running task. Task rooms come from a task factory that
+    reads the context variable set by watch_loop().
+
+    The watchdog stops once the last room watching the loop is released, so a
+    thread-executor worker does not keep one monitor thread per finished job.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float = STALL_THRESHOLD) -> None:
+        self.threshold = threshold
+        self.lags_ms: deque[float] = deque(maxlen=1200)
+        self.stalls_by_room: Counter[str] = Counter()
+        self.offenders: dict[str, _Offender] = {}
+        self.rooms: set[str] = set()
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._task_rooms: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+        self._last_beat = time.perf_counter()
+        self._expected = self._last_beat + HEARTBEAT_INTERVAL
+        self._last_report = self._last_beat
+        self._pending: Stall | None = None
+        self._closed = False
+
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+        loop.call_later(HEARTBEAT_INTERVAL, self._beat)
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        room = kwargs["context"].get(_room) if kwargs.get("context") is not None else _room.get()
+        if room is not None:
+            self._task_rooms[task] = room
+        return task
+
+    def _beat(self) -> None:
+        if self._closed:
+            return
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self._last_beat = now
+        self._expected = now + HEARTBEAT_INTERVAL
+        self.lags_ms.append(lag * 1000)
+
+        pending, self._pending = self._pending, None
+        # a stall that ended while its stack was being captured is a false positive
+        if pending is not None and lag >= self.threshold:
+            pending.duration_ms = lag * 1000
+            self._record(pending)
+
+        if now - self._last_report > REPORT_INTERVAL:
+            self._last_report = now
+            self.log_report()
+        self._loop.call_later(HEARTBEAT_INTERVAL, self._beat)
+
+    def _monitor(self) -> None:
+        reported_beat = None
+        while not self._closed:
+            time.sleep(self.threshold / 2)
+            beat = self._last_beat
+            if beat == reported_beat or time.perf_counter() - beat < self.threshold + HEARTBEAT_INTERVAL:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            task = asyncio.current_task(self._loop)
+            room = self._task_rooms.get(task, "unattributed") if task is not None else "unattributed"
+            self._pending = Stall(room, _location(stack), stack.format())
+
+    def _record(self, stall: Stall) -> None:
+        self.stalls_by_room[stall.room] += 1
+        offender = self.offenders.setdefault(stall.location, _Offender())
+        offender.count += 1
+        offender.total_ms += stall.duration_ms
+        if stall.duration_ms > offender.max_ms:
+            offender.max_ms = stall.duration_ms
+            offender.stack = stall.stack
+        logger.warning(
+            f"[{stall.room}] event loop blocked for {stall.duration_ms:.0f}ms in {stall.location}\n"
+            + "".join(stall.stack[-8:])
+        )
+
+    def worst_offenders(self, n: int = 5) -> list[tuple[str, _Offender]]:
+        return sorted(self.offenders.items(), key=lambda item: item[1].total_ms, reverse=True)[:n]
+
+    def log_report(self) -> None:
+        if not self.lags_ms:
+            return
+        lags = sorted(self.lags_ms)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        logger.info(
+            f"Event loop lag p99 {p99:.1f}ms, max {lags[-1]:.1f}ms; stalls per room: {dict(self.stalls_by_room)}"
+        )
+        for location, offender in self.worst_offenders():
+            logger.info(
+                f"  {location}: {offender.count} stalls, {offender.total_ms:.0f}ms total, {offender.max_ms:.0f}ms worst"
+            )
+
+    def release(self, room: str) -> None:
+        self.rooms.discard(room)
+        if not self.rooms and not self._closed:
+            self.log_report()
+            self.close()
+
+    def close(self) -> None:
+        self._closed = True
+        if self._loop.get_task_factory() == self._task_factory:
+            self._loop.set_task_factory(self._previous_factory)
+        if _watchdogs.get(self._loop) is self:
+            del _watchdogs[self._loop]
+
+
+_watchdogs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LoopWatchdog]" = weakref.WeakKeyDictionary()
+
+
+def watch_loop(room: str) -> LoopWatchdog:
+    """Attribute everything the calling task starts from now on to `room`.
+
+    Starts the watchdog for the running loop on first use.
+    """
+    loop = asyncio.get_running_loop()
+    watchdog = _watchdogs.get(loop)
+    if watchdog is None:
+        watchdog = _watchdogs[loop] = LoopWatchdog(loop)
+    watchdog.rooms.add(room)
+    _room.set(room)
+    current = asyncio.current_task()
+    if current is not None:
+        watchdog._task_rooms[current] = room
+    return watchdog
+
+
+def watch_job(ctx) -> LoopWatchdog:
+    """watch_loop() for a job's room, released when the job shuts down."""
+    room = ctx.room.name
+    watchdog = watch_loop(room)
+
+    async def _release() -> None:
+        watchdog.release(room)
+
+    ctx.add_shutdown_callback(_release)
+    return watchdog
@@ -0,0 +1,198 @@
+import logging
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from profile_store import Profile, ProfileStore
+
+logger = logging.getLogger("soul_agent")
+
+# Same weights as ProfileStore.candidates()
+SHARED_LIKE = 3
+SHARED_DISLIKE = 1
+CONFLICT = -2
+SAME_DREAM_CITY = 2
+SAME_HOMETOWN = 1
+
+_NO_CITY = -1
+_NO_ROWS = np.empty(0, dtype=np.int32)
+
+
+@dataclass
+class Match:
+    user_id: str
+    score: int
+
+
+class _Postings:
+    """term id -> the rows holding it, one growable int32 array per term.
+
+    Memory follows the number of (profile, term) pairs, however large the
+    vocabulary of free-text likes grows.
+    """
+
+    def __init__(self) -> None:
+        self._rows: list[np.ndarray] = []
+        self._counts: list[int] = []
+
+    @property
+    def nbytes(self) -> int:
+        return sum(rows.nbytes for rows in self._rows)
+
+    def add(self, term: int, row: int) -> None:
+        while term >= len(self._rows):
+            self._rows.append(np.empty(4, dtype=np.int32))
+            self._counts.append(0)
+        rows, count = self._rows[term], self._counts[term]
+        if count == rows.size:
+            rows = self._rows[term] = np.resize(rows, rows.size * 2)
+        rows[count] = row
+        self._counts[term] = count + 1
+
+    def remove(self, term: int, row: int) -> None:
+        rows, count = self._rows[term], self._counts[term]
+        # order within a posting list does not matter, the last row takes its place
+        at = int(np.flatnonzero(rows[:count] == row)[0])
+        rows[at] = rows[count - 1]
+        self._counts[term] = count - 1
+
+    def get(self, term: int) -> np.ndarray:
+        return self._rows[term][: self._counts[term]] if term < len(self._rows) else _NO_ROWS
+
+
+class MatchIndex:
+    """The whole population as arrays, for scoring one profile against everyone at once.
+
+    Likes and dislikes are posting lists over a shared term vocabulary: a
+    query only adds its weights to the rows listed under its own few terms,
+    then a couple of comparisons on the integer city codes and argpartition
+    give the top-k. Per-profile columns grow by doubling.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self.user_ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._terms: dict[str, int] = {}
+        self._cities: dict[str, int] = {}
+        self._likes = _Postings()
+        self._dislikes = _Postings()
+        # the term ids each row is listed under, to unlist it when the profile changes
+        self._row_terms: list[tuple[list[int], list[int]]] = []
+        self._hometown = np.full(capacity, _NO_CITY, dtype=np.int32)
+        self._dream_city = np.full(capacity, _NO_CITY, dtype=np.int32)
+        self._height = np.zeros(capacity, dtype=np.int16)
+
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[Profile]) -> "MatchIndex":
+        index = cls()
+        for profile in profiles:
+            index.add(profile)
+        return index
+
+    @classmethod
+    def from_store(cls, store: ProfileStore) -> "MatchIndex":
+        index = cls.from_profiles(store.iter_profiles())
+        logger.info(f"Match index loaded: {index.size} profiles, {len(index._terms)} terms, {index.nbytes / 2**20:.1f} MiB")
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        return (self._likes.nbytes + self._dislikes.nbytes
+                + self._hometown.nbytes + self._dream_city.nbytes + self._height.nbytes)
+
+    def _term_ids(self, terms: Iterable[str], grow: bool) -> list[int]:
+        ids = []
+        for term in set(terms):
+            term_id = self._terms.get(term)
+            if term_id is None:
+                if not grow:
+                    continue  # nobody has it, it can't overlap
+                term_id = self._terms[term] = len(self._terms)
+            ids.append(term_id)
+        return ids
+
+    def _city(self, city: str | None, grow: bool) -> int:
+        if not city:
+            return _NO_CITY
+        key = city.strip().lower()
+        code = self._cities.get(key)
+        if code is None:
+            if not grow:
+                return _NO_CITY
+            code = self._cities[key] = len(self._cities)
+        return code
+
+    def _grow_rows(self) -> None:
+        capacity = self._hometown.size * 2
+        self._hometown = np.resize(self._hometown, capacity)
+        self._dream_city = np.resize(self._dream_city, capacity)
+        self._height = np.resize(self._height, capacity)
+
+    def add(self, profile: Profile) -> None:
+        row = self._rows.get(profile.user_id)
+        if row is None:
+            if self.size == self._hometown.size:
+                self._grow_rows()
+            row = self._rows[profile.user_id] = self.size
+            self.user_ids.append(profile.user_id)
+            self._row_terms.append(([], []))
+            self.size += 1
+        old_likes, old_dislikes = self._row_terms[row]
+        for term in old_likes:
+            self._likes.remove(term, row)
+        for term in old_dislikes:
+            self._dislikes.remove(term, row)
+        likes = self._term_ids(profile.likes, grow=True)
+        dislikes = self._term_ids(profile.dislikes, grow=True)
+        for term in likes:
+            self._likes.add(term, row)
+        for term in dislikes:
+            self._dislikes.add(term, row)
+        self._row_terms[row] = (likes, dislikes)
+        self._hometown[row] = self._city(profile.hometown, grow=True)
+        self._dream_city[row] = self._city(profile.dream_city, grow=True)
+        self._height[row] = profile.height_cm or 0
+
+    @staticmethod
+    def _overlap(postings: _Postings, terms: list[int], weight: int, scores: np.ndarray) -> None:
+        for term in terms:
+            # a row is listed once per term, so the fancy-indexed add never collides
+            scores[postings.get(term)] += weight
+
+    def scores(self, profile: Profile) -> np.ndarray:
+        n = self.size
+        likes = self._term_ids(profile.likes, grow=False)
+        dislikes = self._term_ids(profile.dislikes, grow=False)
+
+        scores = np.zeros(n, dtype=np.int32)
+        self._overlap(self._likes, likes, SHARED_LIKE, scores)
+        self._overlap(self._dislikes, dislikes, SHARED_DISLIKE, scores)
+        self._overlap(self._likes, dislikes, CONFLICT, scores)
+
+        dream_city = self._city(profile.dream_city, grow=False)
+        if dream_city != _NO_CITY:
+            scores += SAME_DREAM_CITY * (self._dream_city[:n] == dream_city)
+        hometown = self._city(profile.hometown, grow=False)
+        if hometown != _NO_CITY:
+            scores += SAME_HOMETOWN * (self._hometown[:n] == hometown)
+        return scores
+
+    def top_k(self, profile: Profile, k: int = 20, height_range_cm: tuple[int, int] | None = None) -> list[Match]:
+        if self.size == 0:
+            return []
+        scores = self.scores(profile)
+        own_row = self._rows.get(profile.user_id)
+        if own_row is not None:
+            scores[own_row] = 0
+        if height_range_cm is not None:
+            height = self._height[: self.size]
+            scores[(height < height_range_cm[0]) | (height > height_range_cm[1])] = 0
+
+        rows = np.flatnonzero(scores > 0)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        # best first, ties in insertion order like ProfileStore.candidates()
+        rows = rows[np.lexsort((rows, -scores[rows]))]
+        return [Match(self.user_ids[i], int(scores[i])) for i in rows]
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from livekit import agents
+from livekit.agents import AgentSession, vad as livekit_vad
+
+from plugin_registry import plugins
+
+logger = logging.getLogger("soul_agent")
+
+
+def _load_vad():
+    # one VAD per process whose streams share batched ONNX calls, see batched_vad
+    from batched_vad import BatchedVAD
+    return BatchedVAD.load()
+
+
+def _load_turn_detector():
+    # MultilingualModel binds to the process' inference executor through the job
+    # context, so it can only be built once the first job is running. Later jobs in
+    # the same process reuse it; the ONNX weights live in the shared inference process.
+    return plugins.get("turn_detector").MultilingualModel()
+
+
+def _check_shareable(name: str, model: Any) -> None:
+    # A model handed to several AgentSessions must not carry per-call state.
+    # silero.VAD keeps only the ONNX session; the recurrent state lives on each
+    # VADStream, so one VAD can serve any number of sessions. The turn detector
+    # is stateless: every predict_end_of_turn() gets the whole chat context.
+    if isinstance(model, livekit_vad.VADStream):
+        raise TypeError(f"{name}: a VADStream is bound to one audio stream, register the VAD instead")
+    if isinstance(model, livekit_vad.VAD):
+        return
+    if callable(getattr(model, "predict_end_of_turn", None)):
+        return
+    raise TypeError(f"{name}: {type(model).__name__} is not known to be safe to share across sessions")
+
+
+class ModelRegistry:
+    def __init__(self) -> None:
+        self._loaders: dict[str, Callable[[], Any]] = {}
+        self._models: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = self._loaders[name]()
+                _check_shareable(name, model)
+                self._models[name] = model
+                logger.info(f"Loaded {name} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return model
+
+    def prewarm(self, proc: agents.JobProcess, *names: str) -> None:
+        for name in names:
+            proc.userdata[name] = self.get(name)
+
+    def vad(self) -> livekit_vad.VAD:
+        return self.get("vad")
+
+    def turn_detector(self):
+        return self.get("turn_detector")
+
+
+# One registry per worker process: prewarm fills it, every job in the process reuses it.
+registry = ModelRegistry()
+registry.register("vad", _load_vad)
+registry.register("turn_detector", _load_turn_detector)
+
+
+class JobSetupTimer:
+    def __init__(self, room_name: str) -> None:
+        self.room_name = room_name
+        self._started = time.perf_counter()
+        self._greeted = False
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def mark(self, stage: str) -> None:
+        logger.info(f"[{self.room_name}] {stage} after {self.elapsed_ms():.0f}ms")
+
+    def watch(self, session: AgentSession) -> None:
+        # The first time the agent starts speaking is the first greeting the caller hears.
+        @session.on("agent_state_changed")
+        def _on_agent_state_changed(ev):
+            if not self._greeted and ev.new_state == "speaking":
+                self._greeted = True
+                self.mark("first greeting")
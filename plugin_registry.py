@@ -0,0 +1,64 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from types import ModuleType
+
+logger = logging.getLogger("soul_agent")
+
+# name an agent selects -> module it imports
+PLUGINS = {
+    "cartesia": "livekit.plugins.cartesia",
+    "deepgram": "livekit.plugins.deepgram",
+    "elevenlabs": "livekit.plugins.elevenlabs",
+    "groq": "livekit.plugins.groq",
+    "noise_cancellation": "livekit.plugins.noise_cancellation",
+    "silero": "livekit.plugins.silero",
+    "turn_detector": "livekit.plugins.turn_detector.multilingual",
+}
+
+
+class PluginRegistry:
+    """Imports a LiveKit plugin only when the running agent selects it.
+
+    Each entry module selects the plugins it uses at import time, which is on
+    the worker's main thread: plugins can only register there, the turn
+    detector has to be registered before the worker starts for its inference
+    runner to exist, and the forkserver preloads exactly the selected modules
+    so every job process shares them copy-on-write. Plugins nobody selects are
+    never imported, in the worker or in any job process.
+    """
+
+    def __init__(self) -> None:
+        self._selected: list[str] = []
+        self.import_ms: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def select(self, *names: str) -> tuple[ModuleType, ...]:
+        modules = tuple(self.get(name) for name in names)
+        with self._lock:
+            self._selected.extend(name for name in names if name not in self._selected)
+        return modules
+
+    def get(self, name: str) -> ModuleType:
+        path = PLUGINS[name]
+        module = sys.modules.get(path)
+        if module is not None:
+            return module
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError(f"Plugin {name} was not selected at startup, it can only be imported on the main thread")
+
+        started = time.perf_counter()
+        module = importlib.import_module(path)
+        self.import_ms[name] = (time.perf_counter() - started) * 1000
+        logger.debug(f"Imported plugin {name} in {self.import_ms[name]:.0f}ms")
+        return module
+
+    def preload_modules(self) -> list[str]:
+        with self._lock:
+            return [PLUGINS[name] for name in self._selected]
+
+
+# One registry per process, filled by the entry module's selection.
+plugins = PluginRegistry()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+logger = logging.getLogger("soul_agent")
+
+# Shared by every session in the worker process. Extraction and logging are I/O bound
+# (LLM and storage calls), so threads keep them off the event loop without pickling.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("POST_PROCESSING_THREADS", 4)),
+    thread_name_prefix="post-processing",
+)
+
+
+def _mark_retrieved(future: asyncio.Future) -> None:
+    # failures are already logged by the worker, callers may ignore the future
+    if not future.cancelled():
+        future.exception()
+
+
+@dataclass
+class _Job:
+    name: str
+    fn: Callable[..., Any]
+    args: tuple
+    future: asyncio.Future
+    idempotent: bool = False
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+class PostProcessor:
+    def __init__(self, name: str, max_pending: int = 32, retries: int = 2, retry_delay: float = 0.5,
+                 executor: Executor | None = None) -> None:
+        self.name = name
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._executor = executor or _executor
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=max_pending)
+        self._worker_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        # A single worker per session keeps the session's jobs in submission order
+        if self._worker_task is None:
+            self._worker_task = asyncio.create_task(self._worker(), name=f"{self.name}-post-processing")
+
+    async def submit(self, name: str, fn: Callable[..., Any], *args: Any, idempotent: bool = False) -> asyncio.Future:
+        """Queue fn(*args) to run off the event loop.
+
+        Waits only while the queue is full (backpressure), not for the job itself.
+        The returned future resolves with the job's result once it has finished.
+        Only idempotent jobs are retried: a failed write may have partly
+        succeeded, and running an append or insert again would duplicate it.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_mark_retrieved)
+        await self._queue.put(_Job(name, fn, args, future, idempotent))
+        return future
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(loop, job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, loop: asyncio.AbstractEventLoop, job: _Job) -> None:
+        retries = self.retries if job.idempotent else 0
+        for attempt in range(retries + 1):
+            try:
+                result = await loop.run_in_executor(self._executor, job.fn, *job.args)
+            except Exception as e:
+                if attempt == retries:
+                    logger.error(f"[{self.name}] {job.name} failed after {attempt + 1} attempts: {e}")
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                    return
+                logger.warning(f"[{self.name}] {job.name} failed (attempt {attempt + 1}), retrying: {e}")
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+            else:
+                elapsed = (time.perf_counter() - job.submitted_at) * 1000
+                logger.info(f"[{self.name}] {job.name} finished in {elapsed:.0f}ms")
+                if not job.future.done():
+                    job.future.set_result(result)
+                return
+
+    async def aclose(self, timeout: float | None = None) -> None:
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{self.name}] dropping {self._queue.qsize()} unfinished post-processing jobs")
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            self._worker_task = None
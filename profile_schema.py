@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from livekit.agents import llm
+
+logger = logging.getLogger("soul_agent")
+
+VARIANTS_PATH = os.getenv("PROFILE_VARIANTS_PATH", "profile_variants.json")
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_NUMBER = r"(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")"
+
+# whole words only: "Sophia", "Umar" and "Wellington" start like fillers
+_FILLERS = re.compile(r"\b(?:uh+m*|um+|ah+|er+m*|hmm+)\b,?\s*", re.I)
+# real words are fillers only at the start or set off by a comma: "my name is Well", "I like, pizza"
+_LEADING_FILLERS = re.compile(r"^(?:(?:well|so|okay|ok|you know|like)\b,?\s*)+", re.I)
+_COMMA_FILLERS = re.compile(r"\b(?<!\bi )(?<!\bwe )(?<!\byou )(?<!\bthey )(?<!\breally )(?:well|so|you know|like),\s*", re.I)
+# "I think Tokyo": the answer is hedged, the LLM fallback tells the value from the hedge
+_HEDGE = re.compile(r"^(?:i think|i guess|i believe|i suppose|i'd say|i would say|not sure but|perhaps|probably|maybe)\b\s*", re.I)
+_NAME_PREFIX = re.compile(
+    r"^(?:(?:hi|hello|hey)\b[\s,!.]*)?(?:my name is|my name's|i am|i'm|im|it's|it is|this is|"
+    r"you can call me|call me|they call me|people call me|everyone calls me)\s+",
+    re.I,
+)
+_PLACE_PREFIX = re.compile(
+    r"^(?:i'm from|i am from|i come from|i grew up in|i was born in|i was raised in|my hometown is|"
+    r"i'd love to live in|i would love to live in|i'd like to live in|i would like to live in|"
+    r"i want to live in|probably|definitely|maybe|somewhere like|it's|it is|from)\s+",
+    re.I,
+)
+_LIST_PREFIX = re.compile(
+    r"^(?:i really|i|i'd say i|things like|stuff like)?\s*(?:like|love|enjoy|dislike|hate|don't like|do not like|"
+    r"can't stand|cannot stand|am into|'m into),?\s+",
+    re.I,
+)
+_LIST_SPLIT = re.compile(r"\s*(?:,|;|\band also\b|\band\b|\bor\b|\balso\b)\s*", re.I)
+# what follows "I'm" or a dangling "my name is" when no name was given: "I'm tall", "I'm not sure"
+_NOT_NAMES = frozenset((
+    "i", "me", "my", "name", "is", "a", "an", "the", "not", "just", "so", "very", "really", "from", "in", "here",
+    "fine", "good", "great", "okay", "ok", "sorry", "sure", "ready", "tall", "short", "single", "married",
+    "busy", "tired", "happy", "doing", "called", "yes", "no", "yeah",
+))
+_UNKNOWN = re.compile(r"\b(?:don't know|do not know|not sure|no idea|skip|pass)\b", re.I)
+
+_FEET_INCHES = re.compile(
+    _NUMBER + r"\s*(?:'|’|ft\.?|feet|foot)\s*(?:and\s*)?(?:" + _NUMBER + r"\s*(?:\"|”|in\.?|inch|inches)?)?",
+    re.I,
+)
+_CENTIMETERS = re.compile(r"(\d{3})\s*(?:cm|cms|centimet(?:er|re)s?)", re.I)
+_METERS = re.compile(r"([12])[.,](\d{1,2})\s*(?:m|meters?|metres?)\b", re.I)
+
+
+def _clean(text: str) -> str:
+    text = _FILLERS.sub("", text).strip()
+    text = _COMMA_FILLERS.sub("", _LEADING_FILLERS.sub("", text))
+    return text.strip(" .!?,")
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token.lower()]
+
+
+def _title(text: str) -> str:
+    # keep "McDonald" or "NYC" as spoken, fix all-lowercase transcripts
+    return " ".join(w if any(c.isupper() for c in w) else w.capitalize() for w in text.split())
+
+
+def extract_name(answer: str) -> str | None:
+    text = _NAME_PREFIX.sub("", _clean(answer))
+    words = re.findall(r"[A-Za-z][A-Za-z'\-]*", text)
+    if not words or len(words) > 3 or _UNKNOWN.search(answer) or _HEDGE.match(text):
+        return None
+    if any(word.lower() in _NOT_NAMES for word in words):
+        return None
+    return _title(" ".join(words))
+
+
+def extract_place(answer: str) -> str | None:
+    text = _clean(answer)
+    while True:
+        stripped = _PLACE_PREFIX.sub("", text)
+        if stripped == text:
+            break
+        text = stripped
+    # "Paris, because of the food" -> "Paris"
+    text = re.split(r"\s*(?:,|\bbecause\b|\bsince\b|\bas\b)\s*", text, maxsplit=1)[0]
+    words = text.split()
+    if not words or len(words) > 4 or _UNKNOWN.search(answer) or _HEDGE.match(text):
+        return None
+    return _title(text)
+
+
+def extract_list(answer: str) -> list[str] | None:
+    # a hedged list is still the list
+    text = _LIST_PREFIX.sub("", _HEDGE.sub("", _clean(answer)))
+    items = [item.strip(" .!?").lower() for item in _LIST_SPLIT.split(text)]
+    items = [item for item in items if item]
+    if not items or _UNKNOWN.search(answer):
+        return None
+    return items
+
+
+def extract_height(answer: str) -> int | None:
+    """Height in centimeters from answers like "5'10", "five foot ten", "178 cm" or "1.78m"."""
+    text = answer.replace("-", " ")
+    match = _CENTIMETERS.search(text)
+    if match:
+        return int(match.group(1))
+    match = _METERS.search(text)
+    if match:
+        return round(float(f"{match.group(1)}.{match.group(2)}") * 100)
+    match = _FEET_INCHES.search(text)
+    if match:
+        feet = _number(match.group(1))
+        inches = _number(match.group(2)) if match.group(2) else 0
+        if 3 <= feet <= 8 and inches < 12:
+            return round((feet * 12 + inches) * 2.54)
+    return None
+
+
+def describe_list(items: list[str]) -> str:
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def describe_height(cm: int) -> str:
+    feet, inches = divmod(round(cm / 2.54), 12)
+    return f"{feet} foot {inches}" if inches else f"{feet} foot"
+
+
+@dataclass(frozen=True)
+class Slot:
+    key: str
+    label: str
+    question: str
+    variants: tuple[str, ...]
+    acknowledgement: str
+    extract: Callable[[str], Any]
+    describe: Callable[[Any], str] = str
+    answer_shape: str = "short"  # "long" for answers people think through, drives endpointing
+
+    def all_variants(self) -> tuple[str, ...]:
+        return _variants.get(self.key, self.variants)
+
+    def ask(self) -> str:
+        return random.choice(self.all_variants())
+
+    def acknowledge(self, value: Any) -> str:
+        text = self.describe(value) if not isinstance(value, str) else value
+        return self.acknowledgement.format(value=text)
+
+
+PROFILE_SLOTS = {
+    slot.key: slot for slot in (
+        Slot(
+            key="name",
+            label="name",
+            question="What is your name?",
+            variants=("What is your name?", "So, what should I call you?", "First things first, what's your name?"),
+            acknowledgement="Okay, I have that your name is {value}.",
+            extract=extract_name,
+        ),
+        Slot(
+            key="hometown",
+            label="hometown",
+            question="Where is your hometown?",
+            variants=("Where is your hometown?", "Where did you grow up?", "Which town do you call home?"),
+            acknowledgement="Okay, I have that your hometown is {value}.",
+            extract=extract_place,
+        ),
+        Slot(
+            key="likes",
+            label="likes",
+            question="What are some things you like?",
+            variants=("What are some things you like?", "Tell me a few things you really enjoy.", "What makes you happy? Hobbies, food, anything."),
+            acknowledgement="Okay, I have that you like {value}.",
+            extract=extract_list,
+            describe=describe_list,
+            answer_shape="long",
+        ),
+        Slot(
+            key="dream_city",
+            label="dream city",
+            question="What city would you love to live in someday?",
+            variants=("What city would you love to live in someday?", "If you could live anywhere, which city would it be?", "What's your dream city?"),
+            acknowledgement="Okay, I have that your dream city is {value}.",
+            extract=extract_place,
+        ),
+        Slot(
+            key="dislikes",
+            label="dislikes",
+            question="What are some things you dislike?",
+            variants=("What are some things you dislike?", "And what are a few things you can't stand?", "Any pet peeves? What do you dislike?"),
+            acknowledgement="Okay, I have that you dislike {value}.",
+            extract=extract_list,
+            describe=describe_list,
+            answer_shape="long",
+        ),
+        Slot(
+            key="height",
+            label="height",
+            question="How tall are you?",
+            variants=("How tall are you?", "Last one, what's your height?", "And how tall are you?"),
+            acknowledgement="Okay, I have that you are {value} tall.",
+            extract=extract_height,
+            describe=describe_height,
+        ),
+    )
+}
+
+
+def slots(*keys: str) -> list[Slot]:
+    return [PROFILE_SLOTS[key] for key in keys or PROFILE_SLOTS]
+
+
+def all_questions() -> list[str]:
+    return [variant for slot in PROFILE_SLOTS.values() for variant in slot.all_variants()]
+
+
+def _load_variants(path: str) -> dict[str, tuple[str, ...]]:
+    # Extra phrasings generated once with generate_variants() and reused by every worker
+    try:
+        with open(path) as f:
+            generated = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable question variants {path}: {e}")
+        return {}
+    return {key: tuple(PROFILE_SLOTS[key].variants) + tuple(values) for key, values in generated.items() if key in PROFILE_SLOTS}
+
+
+_variants = _load_variants(VARIANTS_PATH)
+
+
+async def _complete(llm_engine: llm.LLM, prompt: str) -> str:
+    chat_ctx = llm.ChatContext()
+    chat_ctx.add_message(role="user", content=prompt)
+    text = ""
+    async with llm_engine.chat(chat_ctx=chat_ctx) as stream:
+        async for chunk in stream:
+            if chunk.delta and chunk.delta.content:
+                text += chunk.delta.content
+    return text.strip()
+
+
+async def generate_variants(llm_engine: llm.LLM, path: str = VARIANTS_PATH, per_slot: int = 5) -> None:
+    generated = {}
+    for slot in PROFILE_SLOTS.values():
+        text = await _complete(
+            llm_engine,
+            f"Write {per_slot} short, warm, natural ways a matchmaker could ask: \"{slot.question}\". "
+            "One per line, no numbering, no quotes.",
+        )
+        generated[slot.key] = [line.strip(" -\"") for line in text.splitlines() if line.strip()][:per_slot]
+    # workers read the file at import, they never see it half written
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(generated, f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote {sum(map(len, generated.values()))} question variants to {path}")
+    _variants.clear()
+    _variants.update(_load_variants(path))
+
+
+class SlotFiller:
+    """Fills profile slots with the local extractors, the LLM is only asked when they fail."""
+
+    def __init__(self, llm_engine: llm.LLM | None = None) -> None:
+        self.llm = llm_engine
+
+    async def fill(self, slot: Slot, answer: str) -> Any:
+        value = slot.extract(answer)
+        if value is not None:
+            return value
+
+        if self.llm is not None:
+            try:
+                extracted = await _complete(
+                    self.llm,
+                    f"The user was asked \"{slot.question}\" and answered: \"{answer}\". "
+                    f"Reply with only their {slot.label}, or NONE if they did not give it.",
+                )
+            except Exception as e:
+                logger.warning(f"LLM fallback for {slot.key} failed: {e}")
+            else:
+                if extracted and extracted.upper() != "NONE":
+                    value = slot.extract(extracted)
+                    if value is not None:
+                        return value
+
+        logger.info(f"Could not extract {slot.key}, keeping the raw answer")
+        return answer.strip()
+
+
+async def _main(args) -> None:
+    from livekit.plugins import groq
+
+    llm_engine = groq.LLM(model=args.model)
+    try:
+        await generate_variants(llm_engine, args.path, args.per_slot)
+    finally:
+        await llm_engine.aclose()
+
+
+if __name__ == "__main__":
+    # python -m profile_schema --per-slot 5, once per deploy: every worker loads the file at import
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Generate the question variants file the agents load")
+    parser.add_argument("--path", default=VARIANTS_PATH)
+    parser.add_argument("--per-slot", type=int, default=5)
+    parser.add_argument("--model", default="llama-3.3-70b-versatile")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
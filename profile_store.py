@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger("soul_agent")
+
+DB_PATH = os.getenv("PROFILE_DB_PATH", "profiles.db")
+
+LIKE, DISLIKE = 0, 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    hometown TEXT COLLATE NOCASE,
+    dream_city TEXT COLLATE NOCASE,
+    height_cm INTEGER,
+    likes TEXT NOT NULL DEFAULT '[]',
+    dislikes TEXT NOT NULL DEFAULT '[]',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_hometown ON profiles (hometown);
+CREATE INDEX IF NOT EXISTS profiles_dream_city ON profiles (dream_city);
+CREATE INDEX IF NOT EXISTS profiles_height ON profiles (height_cm);
+
+-- inverted index over likes/dislikes, clustered by term so a lookup reads one contiguous range
+CREATE TABLE IF NOT EXISTS profile_terms (
+    term TEXT NOT NULL,
+    kind INTEGER NOT NULL,
+    profile_id INTEGER NOT NULL,
+    PRIMARY KEY (term, kind, profile_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS profile_terms_profile ON profile_terms (profile_id);
+"""
+
+
+@dataclass
+class Profile:
+    user_id: str
+    name: str | None = None
+    hometown: str | None = None
+    dream_city: str | None = None
+    height_cm: int | None = None
+    likes: list[str] = field(default_factory=list)
+    dislikes: list[str] = field(default_factory=list)
+    id: int | None = None
+
+    @classmethod
+    def from_collected_info(cls, user_id: str, info: dict[str, Any]) -> "Profile":
+        # slots the extractors could not parse hold the raw answer
+        height = info.get("height")
+        return cls(
+            user_id=user_id,
+            name=info.get("name"),
+            hometown=info.get("hometown"),
+            dream_city=info.get("dream_city"),
+            height_cm=height if isinstance(height, int) else None,
+            likes=_terms(info.get("likes")),
+            dislikes=_terms(info.get("dislikes")),
+        )
+
+
+def _terms(value: Any) -> list[str]:
+    if not value:
+        return []
+    items = [value] if isinstance(value, str) else value
+    return sorted({item.strip().lower() for item in items if item and item.strip()})
+
+
+@dataclass
+class Candidate:
+    profile: Profile
+    score: int
+
+
+class ProfileStore:
+    """Finished profiles in SQLite, indexed for match-candidate lookup.
+
+    Cities and height have B-tree indexes, likes and dislikes an inverted
+    index (term -> profile ids). candidates() only touches the posting lists
+    of the new profile's terms and the rows of its cities, so its cost follows
+    the number of overlapping profiles, not the size of the table.
+
+    Connections are per thread; call it from a worker thread, not the event loop.
+    """
+
+    def __init__(self, path: str = DB_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save(self, profile: Profile) -> int:
+        """Insert or replace the profile of `profile.user_id`, so saving it again leaves one row."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                """
+                INSERT INTO profiles (user_id, name, hometown, dream_city, height_cm, likes, dislikes, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    name = excluded.name, hometown = excluded.hometown, dream_city = excluded.dream_city,
+                    height_cm = excluded.height_cm, likes = excluded.likes, dislikes = excluded.dislikes,
+                    updated_at = excluded.updated_at
+                RETURNING id
+                """,
+                (profile.user_id, profile.name, profile.hometown, profile.dream_city, profile.height_cm,
+                 json.dumps(profile.likes), json.dumps(profile.dislikes), time.time()),
+            ).fetchone()
+            profile.id = row["id"]
+            conn.execute("DELETE FROM profile_terms WHERE profile_id = ?", (profile.id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO profile_terms (term, kind, profile_id) VALUES (?, ?, ?)",
+                [(term, LIKE, profile.id) for term in profile.likes]
+                + [(term, DISLIKE, profile.id) for term in profile.dislikes],
+            )
+        logger.info(f"Saved profile {profile.id} for {profile.user_id}")
+        return profile.id
+
+    def get(self, user_id: str) -> Profile | None:
+        row = self._connect().execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return _profile(row) if row is not None else None
+
+    def iter_profiles(self) -> Iterator[Profile]:
+        for row in self._connect().execute("SELECT * FROM profiles ORDER BY id"):
+            yield _profile(row)
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def candidates(self, profile: Profile, limit: int = 50, height_range_cm: tuple[int, int] | None = None) -> list[Candidate]:
+        """Profiles sharing the most with `profile`, best first.
+
+        Shared likes count 3, shared dislikes 1, the same dream city 2 and the
+        same hometown 1; a like of theirs that `profile` dislikes counts -2.
+        """
+        parts, params = [], []
+
+        def add(sql: str, score: int, values: Iterable[Any]) -> None:
+            values = list(values)
+            if values and all(v is not None for v in values):
+                parts.append(sql.format(score=score, marks=",".join("?" * len(values))))
+                params.extend(values)
+
+        term_sql = "SELECT profile_id, {score} AS score FROM profile_terms WHERE kind = %d AND term IN ({marks})"
+        add(term_sql % LIKE, 3, profile.likes)
+        add(term_sql % DISLIKE, 1, profile.dislikes)
+        add(term_sql % LIKE, -2, profile.dislikes)
+        add("SELECT id AS profile_id, {score} AS score FROM profiles WHERE dream_city = ?", 2, [profile.dream_city])
+        add("SELECT id AS profile_id, {score} AS score FROM profiles WHERE hometown = ?", 1, [profile.hometown])
+        if not parts:
+            return []
+
+        where = "p.user_id != ?"
+        params.append(profile.user_id)
+        if height_range_cm is not None:
+            where += " AND p.height_cm BETWEEN ? AND ?"
+            params.extend(height_range_cm)
+        params.append(limit)
+
+        rows = self._connect().execute(
+            f"""
+            SELECT p.*, SUM(s.score) AS score
+            FROM ({" UNION ALL ".join(parts)}) AS s JOIN profiles AS p ON p.id = s.profile_id
+            WHERE {where}
+            GROUP BY p.id HAVING SUM(s.score) > 0
+            ORDER BY score DESC, p.id
+            LIMIT ?
+            """,
+            params,
+        ).fetchall()
+        return [Candidate(_profile(row), row["score"]) for row in rows]
+
+
+def _profile(row: sqlite3.Row) -> Profile:
+    return Profile(
+        id=row["id"],
+        user_id=row["user_id"],
+        name=row["name"],
+        hometown=row["hometown"],
+        dream_city=row["dream_city"],
+        height_cm=row["height_cm"],
+        likes=json.loads(row["likes"]),
+        dislikes=json.loads(row["dislikes"]),
+    )
+
+
+_store: ProfileStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore()
+    return _store
+
+
+def save_collected_info(user_id: str, info: dict[str, Any]) -> int:
+    return get_profile_store().save(Profile.from_collected_info(user_id, info))
@@ -4,24 +4,50 @@ import logging
 import os
 
 from livekit import agents
-from livekit.agents import AgentSession, Agent, RunContext, WorkerOptions, cli, function_tool, llm, stt as livekit_stt, tts as livekit_tts, vad as livekit_vad
-from livekit.plugins import (
-    deepgram,
-    silero,
-    groq,
-    elevenlabs,
-)
-# from livekit.plugins.turn_detector.multilingual import MultilingualModel
-
-from message_logger import log_message
-from biodataExtrator import extract_biodata
+from livekit.agents import AgentSession, Agent, RunContext, WorkerOptions, cli, function_tool, get_job_context, llm, stt as livekit_stt, tts as livekit_tts, vad as livekit_vad
+
+from biodata import IncrementalBiodata
+from context_window import ContextWindow
+from conversation_log import get_conversation_log
+from endpointing import AdaptiveEndpointing, endpointing_policy
+from latency_tracing import LatencyTracer
+from llm_cache import CachedLLM, response_cache
+from loop_watchdog import watch_job
+from model_registry import JobSetupTimer, registry
+from plugin_registry import plugins
+from post_processing import PostProcessor
+from profile_store import save_collected_info
+from profile_schema import SlotFiller, all_questions, slots
+from session_snapshots import SessionSnapshotter, get_snapshot_store
+from speculative import Speculator
+from tts_cache import audio_cache, say_cached
+from turn_controller import TurnController
+from turn_output import TurnOutput
+from worker_scheduler import scheduler
 
 load_dotenv()
+
+# Only the plugins this agent uses are imported, on the main thread so the forkserver preloads them
+deepgram, elevenlabs, groq = plugins.select("deepgram", "elevenlabs", "groq")
+plugins.select("silero")  # loaded by the model registry
 logger = logging.getLogger("soul_agent")
 
+ELEVENLABS_VOICE_ID = "Zjz30d9v1e5xCxNVTni6"
+ELEVENLABS_MODEL = "eleven_multilingual_v2"
+# the sample rate is part of the TTS cache key, prewarm looks lines up before any TTS exists
+ELEVENLABS_ENCODING = "mp3_22050_32"
+ELEVENLABS_SAMPLE_RATE = 22050
+GREETING = "Hello! I'm Zoey, I am on a mission to promote Trust, Loyalty and Respect and help you find the best Soul Match possible. Let's get to know you a little better. Tell me something cool about you."
+CLOSING_LINE = "Thank you, I have collected all the information."
+RESUME_LINE = "Welcome back! Let's pick up where we left off."
+# played from the local TTS cache
+FIXED_LINES = [GREETING, RESUME_LINE, CLOSING_LINE, *all_questions()]
+
 
 class SoulInfoAgent(Agent):
-    def __init__(self, session: AgentSession, stt_engine, llm_engine, tts_engine, vad_engine, turn_detector) -> None:
+    def __init__(self, session: AgentSession, stt_engine, llm_engine, tts_engine, vad_engine, turn_detector,
+                 user_id: str = "default_user", session_id: str | None = None,
+                 snapshots: SessionSnapshotter | None = None) -> None:
         super().__init__(
             instructions="""
                 You have a name: Zoey. You are really smart in terms of Love and Connections. You have almost 100% success in connecting perfect couple.
@@ -46,62 +72,157 @@ class SoulInfoAgent(Agent):
             turn_detection=turn_detector,
         )
         self.collected_info = {}
-        self.questions = [
-            "What is your name?",
-            "Where is your hometown?",
-            "What are some things you like?",
-            "What city would you love to live in someday?",
-            "What are some things you dislike?",
-            "How tall are you?"
-        ]
+        self.slots = slots("name", "hometown", "likes", "dream_city", "dislikes", "height")
+        # Local extractors fill the slots, the LLM is only asked when they can't
+        self.slot_filler = SlotFiller(llm_engine)
         self.current_question_index = 0
-        self.user_id = None  # Set dynamically during conversation
+        # Instructions stay a stable prefix, older turns are replaced by the collected slots
+        self.context_window = ContextWindow(type(self).__name__)
+        self.user_id = user_id  # the caller's participant identity
+        self.session_id = session_id or user_id
+        self.transcript = None  # Buffered conversation log, opened on the first user message
+        # Each answer is parsed into the biodata in the background as it arrives
+        self.biodata = IncrementalBiodata(llm_engine)
+        self.profile_task = None
+        # Saving the profile is blocking storage I/O, it runs off the event loop
+        self.post_processor = PostProcessor("soul-info")
+        self.speculator = None
+        self.endpointing = None
+        self.turns = None
+        self.turn_output = None
+        self.snapshots = snapshots  # lets another worker resume the call where this one left it
 
     async def on_enter(self):
-        await self.session.say("Hello! I'm Zoey, I am on a mission to promote Trust, Loyalty and Respect and help you find the best Soul Match possible. Let's get to know you a little better. Tell me something cool about you.")
-        await self.session.generate_reply(instructions=self.questions[self.current_question_index])
+        # Synthesizes the acknowledgement and next question from interim transcripts
+        self.speculator = Speculator(self.session, self.compose_reply)
+        self.endpointing = AdaptiveEndpointing(self.session)  # end-of-turn delays follow the slot being asked
+        self.turns = TurnController(self.session, type(self).__name__)
+        self.turn_output = TurnOutput(self.session, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, controller=self.turns)
+        snapshot = await self.snapshots.restore(self.slots) if self.snapshots is not None else None
+        if snapshot is not None:
+            # the call was handed over mid-onboarding, pick up at the next question
+            self.collected_info = snapshot.collected_info
+            self.current_question_index = snapshot.question_index
+            for key, value in self.collected_info.items():
+                self.biodata.confirm(key, value)
+            await self.say_fixed(RESUME_LINE)
+        else:
+            await self.say_fixed(GREETING)
+        self.speculator.expect(self.slots[self.current_question_index])
+        self.endpointing.expect(self.slots[self.current_question_index])
+        await self.say_fixed(self.slots[self.current_question_index].ask())
+
+    def compose_reply(self, slot, value) -> str:
+        next_index = self.slots.index(slot) + 1
+        follow_up = self.slots[next_index].ask() if next_index < len(self.slots) else CLOSING_LINE
+        return f"{slot.acknowledge(value)} {follow_up}"
 
-    async def on_end_of_turn(self, chat_ctx, new_message, generating_reply: bool):
+    def llm_node(self, chat_ctx, tools, model_settings):
+        pending = [slot.label for slot in self.slots[self.current_question_index:]]
+        chat_ctx = self.context_window.trim(chat_ctx, self.collected_info, pending)
+        return self.context_window.track(Agent.default.llm_node(self, chat_ctx, tools, model_settings))
+
+    async def on_user_turn_completed(self, turn_ctx, new_message):
         try:
-            # Log user message
-            if new_message.role == "user":
-                self.user_id = chat_ctx.session_id or "default_user"
-                log_message(self.user_id, new_message.role, new_message.content)
-
-            if self.current_question_index < len(self.questions):
-                question_key = self.questions[self.current_question_index].lower()\
-                    .replace("what is your ", "")\
-                    .replace("what are some things you ", "")\
-                    .replace("?", "")\
-                    .replace("what city would you love to live in someday", "dream city")
-                
-                self.collected_info[question_key] = new_message.content
-                await self.session.say(f"Okay, I have that your {question_key} is {new_message.content}.")
-                log_message(self.user_id, "assistant", f"Okay, I have that your {question_key} is {new_message.content}.")
-
-                self.current_question_index += 1
-
-                if self.current_question_index < len(self.questions):
-                    await self.session.generate_reply(instructions=self.questions[self.current_question_index])
-                else:
-                    await self.session.say("Thank you, I have collected all the information.")
-                    log_message(self.user_id, "assistant", "Thank you, I have collected all the information.")
-                    
-                    # 🧠 Extract biodata using LLM
-                    biodata = extract_biodata(self.user_id)
-                    logger.info("Extracted biodata: %s", biodata)
+            # a barge-in cancels the rest of the turn, wherever it is
+            async with self.turns.turn():
+                # Log user message
+                if new_message.role == "user":
+                    if self.transcript is None:
+                        self.transcript = get_conversation_log().session(self.user_id, self.session_id)
+                    self.transcript.append(new_message.role, new_message.content)
+                    asked = self.slots[self.current_question_index] if self.current_question_index < len(self.slots) else None
+                    self.biodata.add_message(asked.question if asked else None, new_message.text_content or "")
+
+                if self.current_question_index < len(self.slots):
+                    slot = self.slots[self.current_question_index]
+                    value = await self.slot_filler.fill(slot, new_message.text_content or "")
+                    self.collected_info[slot.key] = value
+                    self.biodata.confirm(slot.key, value)
+                    speculation = self.speculator.take(slot, value)
+                    next_index = self.current_question_index + 1
+                    next_slot = self.slots[next_index] if next_index < len(self.slots) else None
+
+                    if speculation is not None:
+                        # Same answer as the interim transcript: the reply is already synthesized
+                        handle = await self.session.say(speculation.text, audio=speculation.audio())
+                        self.transcript.append("assistant", speculation.text)
+                    else:
+                        acknowledgement = slot.acknowledge(value)
+                        follow_up = next_slot.ask() if next_slot is not None else CLOSING_LINE
+                        # The question's audio is prepared while the acknowledgement plays
+                        handle = await self.turn_output.say(acknowledgement, follow_up)
+                        self.transcript.append("assistant", acknowledgement)
+                        self.transcript.append("assistant", follow_up)
+                    if handle.interrupted:
+                        raise llm.StopResponse()  # the next question was not heard, the user's next answer is for this slot again
 
+                    self.current_question_index = next_index
+                    self.speculator.expect(next_slot)
+                    self.endpointing.expect(next_slot)
+                    # the write runs in a thread, a replacement worker resumes from here
+                    if self.snapshots is not None:
+                        self.snapshots.update(self.slots, self.current_question_index, self.collected_info)
+
+                    if next_slot is None:
+                        # 🧠 The biodata was built turn by turn, only the last answer is still being parsed
+                        self.profile_task = asyncio.create_task(self.finish_profile())
+
+        except llm.StopResponse:
+            raise
         except Exception as e:
-            logger.error(f"Error in on_end_of_turn: {e}")
+            logger.error(f"Error in on_user_turn_completed: {e}")
+        # the scripted reply answered the turn, the session must not generate one of its own
+        raise llm.StopResponse()
+
+    async def finish_profile(self):
+        biodata = await self.biodata.finish()
+        logger.info("Extracted biodata: %s", biodata)
+        # an upsert on the user id, safe to retry
+        await self.post_processor.submit("save profile", save_collected_info, self.user_id, biodata, idempotent=True)
 
     async def on_exit(self):
         print("Conversation ended. Collected info:", self.collected_info)
+        if self.speculator is not None:
+            self.speculator.close()
+        if self.endpointing is not None:
+            self.endpointing.close()
+        if self.turns is not None:
+            self.turns.close()
+        if self.transcript is not None:
+            await self.transcript.aclose()
+        if self.profile_task is not None:
+            await self.profile_task
+        await self.biodata.aclose()
+        await self.post_processor.aclose(timeout=30)
+        if self.snapshots is not None:
+            # an unfinished call's snapshot stays for the worker that takes it over
+            await self.snapshots.aclose(finished=len(self.collected_info) == len(self.slots))
+
+    def say_fixed(self, text: str):
+        # Scripted lines are pre-synthesized at prewarm and played from the local cache
+        return say_cached(self.session, text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, self.session.tts.sample_rate)
+
+
+def prewarm(proc: agents.JobProcess):
+    registry.prewarm(proc, "vad")
+    response_cache.load()
+    endpointing_policy.load()
+    get_snapshot_store()  # opened here, not on the first job's event loop
+    get_conversation_log()  # the index and the replay of a crashed segment, before the first job
+    # disk only, prewarm must not wait on the network; the job fills in what is missing
+    audio_cache.prewarm(FIXED_LINES, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, ELEVENLABS_SAMPLE_RATE)
 
 
 async def entrypoint(ctx: agents.JobContext):
     logger.info(f"Starting Soul Info Agent, room: {ctx.room.name}")
+    watch_job(ctx)  # stalls of the shared event loop are attributed to this room until the job ends
+    setup_timer = JobSetupTimer(ctx.room.name)
     await ctx.connect()
+    # the caller's identity is their user id, for the profile and the transcript
+    participant = await ctx.wait_for_participant()
 
+    # STT and TTS share livekit's HTTP session for the job, the agent session prewarms every client at start
     stt_engine = deepgram.STT(
         model="nova-2-general",
         language="en-US",
@@ -113,12 +234,17 @@ async def entrypoint(ctx: agents.JobContext):
     )
 
     tts_engine = elevenlabs.TTS(
-        voice_id="Zjz30d9v1e5xCxNVTni6",
-        model="eleven_multilingual_v2"
+        voice_id=ELEVENLABS_VOICE_ID,
+        model=ELEVENLABS_MODEL,
+        encoding=ELEVENLABS_ENCODING,
     )
 
-    llm_engine = groq.LLM(model="llama-3.3-70b-versatile")
-    vad_engine = silero.VAD.load()
+    # Repeated onboarding turns are answered from the host-wide response cache
+    llm_engine = CachedLLM(groq.LLM(model="llama-3.3-70b-versatile"))
+    ctx.add_shutdown_callback(response_cache.flush)
+    # the slots' endpointing delays carry over to the next call on this host
+    ctx.add_shutdown_callback(endpointing_policy.flush)
+    vad_engine = registry.vad()
     turn_detector = "vad" #MultilingualModel()
 
     session = AgentSession(
@@ -136,9 +262,17 @@ async def entrypoint(ctx: agents.JobContext):
         tts_engine=tts_engine,
         vad_engine=vad_engine,
         turn_detector=turn_detector,
+        user_id=participant.identity,
+        session_id=ctx.job.id,
+        snapshots=SessionSnapshotter(get_snapshot_store(), ctx.room.name, participant.identity),
     )
 
+    setup_timer.watch(session)
+    tracer = LatencyTracer(session, ctx.room.name, "SoulInfoAgent")
+    ctx.add_shutdown_callback(tracer.aclose)  # the last turns and calls shorter than the dump interval
     await session.start(agent=agent, room=ctx.room)
+    setup_timer.mark("session started")
+    audio_cache.fill_in_background(tts_engine, FIXED_LINES, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL)
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+    cli.run_app(scheduler.worker_options(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
@@ -0,0 +1,247 @@
+import asyncio
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Protocol
+
+from profile_schema import Slot
+
+logger = logging.getLogger("soul_agent")
+
+# a path ending in .db is a SQLite store, anything else a directory of JSON files
+SNAPSHOT_PATH = os.getenv("SESSION_SNAPSHOT_PATH", "session_snapshots.db")
+# older snapshots are calls that were abandoned, not handed off
+SNAPSHOT_TTL = float(os.getenv("SESSION_SNAPSHOT_TTL", "1800"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_snapshots (
+    room TEXT NOT NULL,
+    participant TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (room, participant)
+);
+"""
+
+
+@dataclass
+class Snapshot:
+    room: str
+    participant: str  # a room name can be reused, the call is the room and who is in it
+    slots: list[str]  # the questionnaire the index refers to
+    question_index: int
+    collected_info: dict[str, Any]
+    seq: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "Snapshot":
+        return cls(**json.loads(data))
+
+
+class SnapshotStore(Protocol):
+    def put(self, snapshot: Snapshot) -> None: ...
+    def get(self, room: str, participant: str) -> Snapshot | None: ...
+    def delete(self, room: str, participant: str) -> None: ...
+
+
+class SqliteSnapshotStore:
+    """One row per call; a write never replaces a newer snapshot of the same call.
+
+    Connections are per thread; call it from a worker thread, not the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # a snapshot lost to a power cut costs one re-asked question
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, snapshot: Snapshot) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO session_snapshots (room, participant, seq, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (room, participant) DO UPDATE SET "
+                "seq = excluded.seq, data = excluded.data, updated_at = excluded.updated_at "
+                "WHERE excluded.seq > session_snapshots.seq",
+                (snapshot.room, snapshot.participant, snapshot.seq, snapshot.to_json(), snapshot.updated_at),
+            )
+
+    def get(self, room: str, participant: str) -> Snapshot | None:
+        row = self._connect().execute(
+            "SELECT data FROM session_snapshots WHERE room = ? AND participant = ?", (room, participant)
+        ).fetchone()
+        return Snapshot.from_json(row[0]) if row else None
+
+    def delete(self, room: str, participant: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_snapshots WHERE room = ? AND participant = ?", (room, participant))
+
+
+class FileSnapshotStore:
+    """One JSON file per call, replaced atomically on every write.
+
+    Like the SQLite store, a write never replaces a newer snapshot of the
+    same call: the seq check and the replace run under a lock on the call's
+    lock file, so a late write from a draining worker is dropped.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, room: str, participant: str) -> str:
+        # room names and identities may hold characters that are not safe in a file name
+        return os.path.join(self.directory, hashlib.sha1(f"{room}\0{participant}".encode()).hexdigest() + ".json")
+
+    def put(self, snapshot: Snapshot) -> None:
+        path = self._path(snapshot.room, snapshot.participant)
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            current = self._read(path)
+            if current is not None and current.seq >= snapshot.seq:
+                return
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(snapshot.to_json())
+            os.replace(tmp_path, path)
+
+    def _read(self, path: str) -> Snapshot | None:
+        try:
+            with open(path) as f:
+                return Snapshot.from_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def get(self, room: str, participant: str) -> Snapshot | None:
+        return self._read(self._path(room, participant))
+
+    def delete(self, room: str, participant: str) -> None:
+        path = self._path(room, participant)
+        for name in (path, path + ".lock"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+_store: SnapshotStore | None = None
+_store_lock = threading.Lock()
+
+
+def open_snapshot_store(path: str) -> SnapshotStore:
+    return SqliteSnapshotStore(path) if path.endswith(".db") else FileSnapshotStore(path)
+
+
+def get_snapshot_store() -> SnapshotStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_snapshot_store(SNAPSHOT_PATH)
+    return _store
+
+
+class SessionSnapshotter:
+    """Keeps the state of one onboarding call in the snapshot store, so another worker can resume it.
+
+    update() is called on the turn path and only copies the state: the write
+    runs in a thread, one at a time, and a snapshot taken while the previous
+    one is being written replaces any that was still waiting. A worker that
+    is drained mid-call leaves the latest snapshot behind; the agent that
+    picks the room up again restores it and asks the next question instead
+    of starting over.
+    """
+
+    def __init__(self, store: SnapshotStore, room: str, participant: str, ttl: float = SNAPSHOT_TTL) -> None:
+        self.store = store
+        self.room = room
+        self.participant = participant
+        self.ttl = ttl
+        self._seq = 0
+        self._pending: Snapshot | None = None
+        self._write_task: asyncio.Task | None = None
+        self.update_us: list[float] = []
+        self.write_ms: list[float] = []
+
+    def update(self, slots: list[Slot], question_index: int, collected_info: dict[str, Any]) -> None:
+        started = time.perf_counter()
+        self._seq += 1
+        self._pending = Snapshot(
+            room=self.room,
+            participant=self.participant,
+            slots=[slot.key for slot in slots],
+            question_index=question_index,
+            collected_info=copy.deepcopy(collected_info),
+            seq=self._seq,
+        )
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write(), name="session-snapshot")
+        self.update_us.append((time.perf_counter() - started) * 1e6)
+
+    async def _write(self) -> None:
+        while self._pending is not None:
+            snapshot, self._pending = self._pending, None
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.store.put, snapshot)
+            except Exception as e:
+                logger.warning(f"[{self.room}] could not write session snapshot {snapshot.seq}: {e}")
+                continue
+            self.write_ms.append((time.perf_counter() - started) * 1000)
+
+    async def restore(self, slots: list[Slot]) -> Snapshot | None:
+        """The snapshot a previous agent left for this call, if this agent can resume it."""
+        try:
+            snapshot = await asyncio.to_thread(self.store.get, self.room, self.participant)
+        except Exception as e:
+            logger.warning(f"[{self.room}] could not read session snapshot: {e}")
+            return None
+        if snapshot is None:
+            return None
+        # later snapshots of this call outrank the one found, whether it is resumed or not
+        self._seq = max(self._seq, snapshot.seq)
+        if time.time() - snapshot.updated_at > self.ttl:
+            logger.info(f"[{self.room}] ignoring session snapshot from {time.time() - snapshot.updated_at:.0f}s ago")
+            return None
+        if snapshot.slots != [slot.key for slot in slots] or not 0 < snapshot.question_index < len(slots):
+            return None
+        logger.info(f"[{self.room}] resuming at question {snapshot.question_index + 1} of {len(slots)} from a session snapshot")
+        return snapshot
+
+    async def aclose(self, finished: bool = False) -> None:
+        """Write the last snapshot, or drop the call's snapshot once its profile has been saved."""
+        if self._write_task is not None:
+            await self._write_task
+        if finished:
+            try:
+                await asyncio.to_thread(self.store.delete, self.room, self.participant)
+            except Exception as e:
+                logger.warning(f"[{self.room}] could not delete session snapshot: {e}")
+        if self.write_ms:
+            writes = sorted(self.write_ms)
+            logger.info(
+                f"[{self.room}] {len(writes)} session snapshots, "
+                f"{sum(self.update_us) / len(self.update_us):.0f}us per turn on the loop, "
+                f"write p50 {writes[len(writes) // 2]:.1f}ms max {writes[-1]:.1f}ms"
+            )
@@ -2,18 +2,28 @@ from livekit.agents import (
     Agent,
     AgentSession,
     JobContext,
+    JobProcess,
     RunContext,
     WorkerOptions,
     cli,
     function_tool,
 )
-from livekit.plugins import groq, silero,cartesia, deepgram
 from dotenv import load_dotenv 
 
+from latency_tracing import LatencyTracer
+from loop_watchdog import watch_job
+from model_registry import JobSetupTimer, registry
+from plugin_registry import plugins
+from worker_scheduler import scheduler
+
 load_dotenv()
 
 load_dotenv(dotenv_path=".env.local")
 
+# Only the plugins this agent uses are imported, on the main thread so the forkserver preloads them
+groq, cartesia, deepgram = plugins.select("groq", "cartesia", "deepgram")
+plugins.select("silero")  # loaded by the model registry
+
 @function_tool
 async def lookup_weather(
     context: RunContext,
@@ -24,7 +34,13 @@ async def lookup_weather(
     return {"weather": "sunny", "temperature": 70}
 
 
+def prewarm(proc: JobProcess):
+    registry.prewarm(proc, "vad")
+
+
 async def entrypoint(ctx: JobContext):
+    watch_job(ctx)  # stalls of the shared event loop are attributed to this room until the job ends
+    setup_timer = JobSetupTimer(ctx.room.name)
     await ctx.connect()
 
     agent = Agent(
@@ -39,15 +55,19 @@ async def entrypoint(ctx: JobContext):
     stt_engine = deepgram.STT(model="nova-2-general", language="en-US", interim_results=True, smart_format=True, punctuate=True, filler_words=True, profanity_filter=False, keywords=[("LiveKit", 1.5)])
     tts_engine = cartesia.TTS(model="sonic-2")
     session = AgentSession(
-        vad=silero.VAD.load(),
+        vad=registry.vad(),
         # any combination of STT, LLM, TTS, or realtime API can be used
         stt=stt_engine,  
         llm=groq.LLM(model="llama-3.3-70b-versatile"),
         tts=tts_engine, 
     )
 
+    setup_timer.watch(session)
+    tracer = LatencyTracer(session, ctx.room.name, "soul_agent")
+    ctx.add_shutdown_callback(tracer.aclose)  # the last turns and calls shorter than the dump interval
     await session.start(agent=agent, room=ctx.room)
+    setup_timer.mark("session started")
     await session.generate_reply(instructions="Say hello, then ask the user how their day is going and how you can help.")
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(scheduler.worker_options(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
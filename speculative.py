@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from livekit import rtc
+from livekit.agents import AgentSession
+
+from profile_schema import Slot
+
+logger = logging.getLogger("soul_agent")
+
+
+@dataclass
+class Speculation:
+    slot_key: str
+    value: Any
+    text: str
+    frames: list[rtc.AudioFrame] = field(default_factory=list)
+    task: asyncio.Task | None = None
+    failed: bool = False
+    _frame_added: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def usable(self) -> bool:
+        # synthesizing or done; a failed synthesis would cut the line short
+        return self.task is not None and not self.task.cancelled() and not self.failed
+
+    def add(self, frame: rtc.AudioFrame) -> None:
+        self.frames.append(frame)
+        self._frame_added.set()
+
+    def finish(self) -> None:
+        # wakes a playout waiting for the next frame, it ends with the task
+        self._frame_added.set()
+
+    async def audio(self) -> AsyncIterator[rtc.AudioFrame]:
+        # frames synthesized so far, then the rest as they arrive
+        sent = 0
+        while True:
+            while sent < len(self.frames):
+                yield self.frames[sent]
+                sent += 1
+            if self.task is None or self.task.done():
+                return
+            self._frame_added.clear()
+            await self._frame_added.wait()
+
+
+class Speculator:
+    """Pre-synthesizes the agent's next line while the user is still answering.
+
+    Every interim transcript is run through the current slot's local extractor.
+    Once the extracted value has been stable for `settle` seconds, the reply
+    (acknowledgement + next question, built by `compose`) is synthesized in the
+    background. At end of turn the agent calls take() with the value extracted
+    from the final transcript; the audio is only used if both values match.
+    A speculation still synthesizing is used too, its audio streams the frames
+    as they arrive.
+    """
+
+    def __init__(self, session: AgentSession, compose: Callable[[Slot, Any], str], settle: float = 0.3) -> None:
+        self._session = session
+        self._compose = compose
+        self._settle = settle
+        self._slot: Slot | None = None
+        self._speculation: Speculation | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self.hits = 0
+        self.misses = 0
+        session.on("user_input_transcribed", self._on_user_input_transcribed)
+
+    def expect(self, slot: Slot | None) -> None:
+        """Set the slot the user's next answer is for."""
+        self.discard()
+        self._slot = slot
+
+    def _on_user_input_transcribed(self, ev) -> None:
+        if self._slot is None:
+            return
+        value = self._slot.extract(ev.transcript)
+        if value is None:
+            return
+        if self._speculation is not None and self._speculation.value == value:
+            return
+
+        self.discard()
+        self._speculation = Speculation(self._slot.key, value, self._compose(self._slot, value))
+        self._timer = asyncio.get_running_loop().call_later(self._settle, self._start, self._speculation)
+
+    def _start(self, speculation: Speculation) -> None:
+        self._timer = None
+        if speculation is self._speculation:
+            speculation.task = asyncio.create_task(self._synthesize(speculation))
+
+    async def _synthesize(self, speculation: Speculation) -> None:
+        try:
+            async with self._session.tts.synthesize(speculation.text) as stream:
+                async for audio in stream:
+                    speculation.add(audio.frame)
+        except Exception as e:
+            speculation.failed = True
+            logger.warning(f"Speculative synthesis for {speculation.slot_key} failed: {e}")
+        finally:
+            speculation.finish()
+
+    def take(self, slot: Slot, value: Any) -> Speculation | None:
+        speculation = self._speculation
+        self._speculation = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if speculation is None:
+            return None
+        if speculation.slot_key != slot.key or speculation.value != value or not speculation.usable:
+            # the final transcript changed the answer, or synthesis has not started or failed
+            if speculation.task is not None:
+                speculation.task.cancel()
+            self.misses += 1
+            logger.debug(f"Speculation for {slot.key} discarded ({self.hits} hits, {self.misses} misses)")
+            return None
+
+        self.hits += 1
+        return speculation
+
+    def discard(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._speculation is not None and self._speculation.task is not None:
+            self._speculation.task.cancel()
+        self._speculation = None
+
+    def close(self) -> None:
+        self.discard()
+        self._session.off("user_input_transcribed", self._on_user_input_transcribed)
@@ -0,0 +1,23 @@
+from profile_schema import extract_list, extract_name, extract_place
+
+
+def test_name_that_is_also_a_filler():
+    assert extract_name("so my name is Well") == "Well"
+    assert extract_name("well, Umar") == "Umar"
+
+
+def test_name_prefix_without_a_name():
+    assert extract_name("Im tall") is None
+    assert extract_name("my name is") is None
+    assert extract_name("I'm Priya Sharma") == "Priya Sharma"
+
+
+def test_list_with_repeated_like():
+    assert extract_list("I like, like, pizza") == ["pizza"]
+    assert extract_list("I really like, um, pizza") == ["pizza"]
+    assert extract_list("like, hiking and, you know, cooking") == ["hiking", "cooking"]
+
+
+def test_fillers_inside_an_answer_are_kept():
+    assert extract_place("I grew up in Wellington") == "Wellington"
+    assert extract_list("I like hiking, old films and cooking") == ["hiking", "old films", "cooking"]
@@ -2,51 +2,51 @@ from dotenv import load_dotenv
 import asyncio
 import logging
 import os
-import requests  # Import requests for fetching data (if needed)
 from livekit import rtc
 from livekit import agents
-from livekit.agents import AgentSession, Agent, RunContext, WorkerOptions, cli, function_tool, llm, stt as livekit_stt, tts as livekit_tts, vad as livekit_vad
-from livekit.plugins import (
-    cartesia,
-    deepgram,
-    silero,groq,
-    noise_cancellation
-)
-from livekit.plugins.turn_detector.multilingual import MultilingualModel  # Import turn detector
+from livekit.agents import AgentSession, Agent, RunContext, WorkerOptions, cli, function_tool, get_job_context, llm, stt as livekit_stt, tts as livekit_tts, vad as livekit_vad
+
+from context_window import ContextWindow
+from endpointing import AdaptiveEndpointing, endpointing_policy
+from latency_tracing import LatencyTracer
+from llm_cache import CachedLLM, response_cache
+from loop_watchdog import watch_job
+from model_registry import JobSetupTimer, registry
+from plugin_registry import plugins
+from post_processing import PostProcessor
+from profile_store import save_collected_info
+from profile_schema import SlotFiller, slots
+from session_snapshots import SessionSnapshotter, get_snapshot_store
+from speculative import Speculator
+from turn_controller import TurnController
+from turn_output import TurnOutput
+from worker_scheduler import scheduler
 
 load_dotenv()
 
+# Only the plugins this agent uses are imported, on the main thread so the forkserver preloads them
+cartesia, deepgram, groq = plugins.select("cartesia", "deepgram", "groq")
+plugins.select("silero", "turn_detector")  # loaded by the model registry
+
 logger = logging.getLogger("soul_agent")
+
+CLOSING_LINE = "Thank you, I have collected all the information."
+RESUME_LINE = "Welcome back! Let's pick up where we left off."
 # lk app create \
 # 	--sandbox 
 # lk app create --template voice-assistant-swift --sandbox interactive-blockchain-1muog9
 def prewarm(proc: agents.JobProcess):
     print("PREWARM FUNCTION CALLED!")
-    proc.userdata["vad"] = silero.VAD.load()
+    registry.prewarm(proc, "vad")
+    response_cache.load()
+    endpointing_policy.load()
+    get_snapshot_store()  # opened here, not on the first job's event loop
     #  Consider pre-loading LLM if needed for faster initial response
     #  proc.userdata["llm"] = groq.LLM(model="llama-3.3-70b-versatile")
 
-    # fetch cartesia voices (optional, if you need this in prewarm)
-    try:
-        headers = {
-            "X-API-Key": os.getenv("CARTESIA_API_KEY", ""),
-            "Cartesia-Version": "2024-08-01",
-            "Content-Type": "application/json",
-        }
-        response = requests.get("https://api.cartesia.ai/voices", headers=headers)
-        if response.status_code == 200:
-            print("Connected to Cartesia API")
-            proc.userdata["cartesia_voices"] = response.json()
-        else:
-            print(f"Error: Failed to fetch Cartesia voices: {response.status_code}")
-            logger.warning(f"Failed to fetch Cartesia voices: {response.status_code}")
-    except Exception as e:
-        logger.error(f"Error during prewarm Cartesia fetch: {e}")
-
-
 
 class SoulInfoAgent(Agent):
-    def __init__(self, session: AgentSession, stt_engine: livekit_stt.STT, llm_engine: llm.LLM, tts_engine: livekit_tts.TTS, vad_engine: livekit_vad.VAD, turn_detector: MultilingualModel) -> None:
+    def __init__(self, session: AgentSession, stt_engine: livekit_stt.STT, llm_engine: llm.LLM, tts_engine: livekit_tts.TTS, vad_engine: livekit_vad.VAD, turn_detector, user_id: str, snapshots: SessionSnapshotter | None = None) -> None:
         super().__init__(
             instructions="""
                 You have a name: Soul. You are really smart in terms of Love and Connections. You have almost 100% success in connecting perfect couple.
@@ -71,69 +71,139 @@ class SoulInfoAgent(Agent):
             turn_detection=turn_detector,  # Pass turn detector
         )
         # self.session = session
+        self.user_id = user_id  # the caller's participant identity, the profile is saved under it
         self.collected_info = {}
-        self.questions = [
-            "What is your name?",
-            "What city would you love to live in someday?",  # More natural
-            "Where is your hometown?",  # More natural
-            "What are some things you like?",
-            "What are some things you dislike?",
-            "How tall are you?",  # More natural
-        ]
+        self.slots = slots("name", "dream_city", "hometown", "likes", "dislikes", "height")
+        self.slot_filler = SlotFiller(llm_engine)  # LLM is only asked when the local extractor fails
         self.current_question_index = 0
+        # Instructions stay a stable prefix, older turns are replaced by the collected slots
+        self.context_window = ContextWindow(type(self).__name__)
+        self.speculator = None
+        self.endpointing = None
+        self.turns = None
+        self.turn_output = None
+        self.post_processor = PostProcessor("soul-info")
+        self.snapshots = snapshots  # lets another worker resume the call where this one left it
 
     async def on_enter(self):
         print("Enter")
-        await self.session.say("Hello! I'm Soul, and I'd like to get to know you a little better. Tell me something cool about you.")
-        await self.session.generate_reply(instructions=self.questions[self.current_question_index])
-
-    async def on_end_of_turn(self, chat_ctx: llm.ChatContext, new_message: llm.ChatMessage, generating_reply: bool) -> None:
+        self.speculator = Speculator(self.session, self.compose_reply)  # pre-synthesizes from interim transcripts
+        self.endpointing = AdaptiveEndpointing(self.session)  # end-of-turn delays follow the slot being asked
+        self.turns = TurnController(self.session, type(self).__name__)
+        self.turn_output = TurnOutput(self.session, controller=self.turns)  # plays acknowledgement + question as one utterance
+        snapshot = await self.snapshots.restore(self.slots) if self.snapshots is not None else None
+        if snapshot is not None:
+            # the call was handed over mid-onboarding, pick up at the next question
+            self.collected_info = snapshot.collected_info
+            self.current_question_index = snapshot.question_index
+            await self.session.say(RESUME_LINE)
+        else:
+            await self.session.say("Hello! I'm Soul, and I'd like to get to know you a little better. Tell me something cool about you.")
+        self.speculator.expect(self.slots[self.current_question_index])
+        self.endpointing.expect(self.slots[self.current_question_index])
+        await self.session.say(self.slots[self.current_question_index].ask())
+
+    def compose_reply(self, slot, value) -> str:
+        next_index = self.slots.index(slot) + 1
+        follow_up = self.slots[next_index].ask() if next_index < len(self.slots) else CLOSING_LINE
+        return f"{slot.acknowledge(value)} {follow_up}"
+
+    def llm_node(self, chat_ctx, tools, model_settings):
+        pending = [slot.label for slot in self.slots[self.current_question_index:]]
+        chat_ctx = self.context_window.trim(chat_ctx, self.collected_info, pending)
+        return self.context_window.track(Agent.default.llm_node(self, chat_ctx, tools, model_settings))
+
+    async def on_user_turn_completed(self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage) -> None:
         print("End of Turn - Called!")  # Debug: Confirm this is called
         print(f"New Message: {new_message}")  # Debug: Inspect the message
         logger.info(f"Agent received user message: {new_message.content}")
         try:
-            # Process user response
-            if self.current_question_index < len(self.questions):
-                question_key = self.questions[self.current_question_index].lower().replace("what is your ", "").replace("what are some things you ", "").replace("?", "")
-                self.collected_info[question_key] = new_message.content
-                await self.session.say(f"Okay, I have that you {question_key} is {new_message.content}.") # Acknowledge
-
-                self.current_question_index += 1
-                if self.current_question_index < len(self.questions):
-                    await self.session.generate_reply(instructions=self.questions[self.current_question_index])
-                else:
-                    await self.session.say("Thank you, I have collected all the information.")
-
+            # a barge-in cancels the rest of the turn, wherever it is
+            async with self.turns.turn():
+                # Process user response
+                if self.current_question_index < len(self.slots):
+                    slot = self.slots[self.current_question_index]
+                    value = await self.slot_filler.fill(slot, new_message.text_content or "")
+                    self.collected_info[slot.key] = value
+                    speculation = self.speculator.take(slot, value)
+                    next_index = self.current_question_index + 1
+                    next_slot = self.slots[next_index] if next_index < len(self.slots) else None
+
+                    if speculation is not None:
+                        handle = await self.session.say(speculation.text, audio=speculation.audio())  # Already synthesized
+                    else:
+                        # Acknowledge, the question is synthesized while the acknowledgement plays
+                        handle = await self.turn_output.say(slot.acknowledge(value), next_slot.ask() if next_slot is not None else CLOSING_LINE)
+                    if handle.interrupted:
+                        raise llm.StopResponse()  # the next question was not heard, the user's next answer is for this slot again
+
+                    self.current_question_index = next_index
+                    self.speculator.expect(next_slot)
+                    self.endpointing.expect(next_slot)
+                    # the write runs in a thread, a replacement worker resumes from here
+                    if self.snapshots is not None:
+                        self.snapshots.update(self.slots, self.current_question_index, self.collected_info)
+
+        except llm.StopResponse:
+            raise
         except Exception as e:
-            logger.error(f"Error in on_end_of_turn: {e}")
+            logger.error(f"Error in on_user_turn_completed: {e}")
+        # the scripted reply answered the turn, the session must not generate one of its own
+        raise llm.StopResponse()
 
     async def on_exit(self) -> None:
         print("Exit")
         print(f"Collected Information: {self.collected_info}") # Print Collected Info.
+        if self.speculator is not None:
+            self.speculator.close()
+        if self.endpointing is not None:
+            self.endpointing.close()
+        if self.turns is not None:
+            self.turns.close()
+        if len(self.collected_info) == len(self.slots):
+            # Finished profiles are kept for matching, the SQLite write runs off the event loop; it is an upsert, safe to retry
+            await self.post_processor.submit("save profile", save_collected_info, self.user_id, dict(self.collected_info), idempotent=True)
+        await self.post_processor.aclose(timeout=30)
+        if self.snapshots is not None:
+            # an unfinished call's snapshot stays for the worker that takes it over
+            await self.snapshots.aclose(finished=len(self.collected_info) == len(self.slots))
 
 async def entrypoint(ctx: agents.JobContext):
     print("Entry Point!")
     logger.info(f"starting Soul Info Agent, room: {ctx.room.name}")
+    watch_job(ctx)  # stalls of the shared event loop are attributed to this room until the job ends
+    setup_timer = JobSetupTimer(ctx.room.name)
     await ctx.connect()
+    # the caller's identity is their user id, for the profile and the snapshot; a room name can be reused
+    participant = await ctx.wait_for_participant()
 
     stt_engine = deepgram.STT(model="nova-2-general", language="en-US", interim_results=True, smart_format=True, punctuate=True, filler_words=True, profanity_filter=False, keywords=[("LiveKit", 1.5)])
     tts_engine = cartesia.TTS(model="sonic-2")
-    vad_engine = silero.VAD.load()
-    turn_detector = MultilingualModel()  # Initialize turn detector
+    # Repeated onboarding turns are answered from the host-wide response cache
+    llm_engine = CachedLLM(groq.LLM(model="llama-3.3-70b-versatile"))
+    ctx.add_shutdown_callback(response_cache.flush)
+    # the slots' endpointing delays carry over to the next call on this host
+    ctx.add_shutdown_callback(endpointing_policy.flush)
+    vad_engine = registry.vad()
+    turn_detector = registry.turn_detector()  # Shared by every room in this process
 
     session = AgentSession(
         turn_detection=turn_detector,  # Pass turn detector to session
         stt=stt_engine,
         vad=vad_engine,
-        llm=groq.LLM(model="llama-3.3-70b-versatile"),  # Or your preferred LLM
+        llm=llm_engine,  # Or your preferred LLM
         tts=tts_engine,
     )
 
-    agent = SoulInfoAgent(session=session, stt_engine=stt_engine, llm_engine=groq.LLM(model="llama-3.3-70b-versatile"), tts_engine=tts_engine, vad_engine=vad_engine, turn_detector=turn_detector)
+    agent = SoulInfoAgent(session=session, stt_engine=stt_engine, llm_engine=llm_engine, tts_engine=tts_engine, vad_engine=vad_engine, turn_detector=turn_detector, user_id=participant.identity, snapshots=SessionSnapshotter(get_snapshot_store(), ctx.room.name, participant.identity))
+    setup_timer.watch(session)
+    tracer = LatencyTracer(session, ctx.room.name, "SoulInfoAgent")
+    ctx.add_shutdown_callback(tracer.aclose)  # the last turns and calls shorter than the dump interval
     await session.start(agent=agent, room=ctx.room)
+    setup_timer.mark("session started")
 
 
 
 if __name__ == "__main__":
     print("PSSSSREWARM FUNCTION CALLED!")
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    agents.cli.run_app(scheduler.worker_options(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
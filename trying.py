@@ -2,62 +2,45 @@ from dotenv import load_dotenv
 import asyncio
 import logging
 import os
-import requests
-import google.generativeai as genai
-from gtts import gTTS
-import tempfile
 from livekit import rtc
 from livekit import agents
 from livekit.agents import AgentSession, Agent, AutoSubscribe, RunContext, RoomInputOptions, llm, stt as livekit_stt, tts as livekit_tts, vad as livekit_vad
-from livekit.plugins import (
-    cartesia,
-    deepgram,
-    silero,groq,
-    noise_cancellation
-)
 from livekit.agents.llm import ChatContext, ChatMessage, StopResponse
 # from livekit.agents import pipeline
 from livekit.agents.llm import function_tool
 # from livekit.agents.pipeline import VoicePipelineAgent
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+from audio_output import SessionAudioOutput
+from gemini_llm import GeminiLLM, sentence_chunks
+from latency_tracing import LatencyTracer
+from loop_watchdog import watch_job
+from model_registry import JobSetupTimer, registry
+from plugin_registry import plugins
+from worker_scheduler import scheduler
 
 load_dotenv()
 
+# Only the plugins this agent uses are imported, on the main thread so the forkserver preloads them
+cartesia, deepgram = plugins.select("cartesia", "deepgram")
+plugins.select("silero", "turn_detector")  # loaded by the model registry
+
 logger = logging.getLogger("transcriber")
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") #Replace with your key.
-genai.configure(api_key=GOOGLE_API_KEY)
+# GeminiLLM configures google.generativeai with GOOGLE_API_KEY when the job creates it
 # models = genai.list_models()
 
 # for model in models:
 #     if 'generateContent' in model.supported_generation_methods:
 #         print(model.name)
 
-model = genai.GenerativeModel('gemini-2.0-flash')
-
 def prewarm(proc: agents.JobProcess):
     print("PREWARM FUNCTION CALLED!")
     # preload models when process starts to speed up first interaction
-    proc.userdata["vad"] = silero.VAD.load()
-
-    # fetch cartesia voices
-
-    headers = {
-        "X-API-Key": os.getenv("CARTESIA_API_KEY", ""),
-        "Cartesia-Version": "2024-08-01",
-        "Content-Type": "application/json",
-    }
-    response = requests.get("https://api.cartesia.ai/voices", headers=headers)
-    if response.status_code == 200:
-        print("Connected")
-        proc.userdata["cartesia_voices"] = response.json()
-    else:
-        print(f"Error: Failed to fetch Cartesia voices: {response.status_code}")
-        logger.warning(f"Failed to fetch Cartesia voices: {response.status_code}")
+    registry.prewarm(proc, "vad")
 
 
 class Assistant(Agent):
-    def __init__(self, session: AgentSession, room: rtc.Room, stt_engine: livekit_stt.STT, llm_engine: llm.LLM, tts_engine: livekit_tts.TTS, vad_engine: livekit_vad.VAD, turn_detector: MultilingualModel) -> None:
+    def __init__(self, session: AgentSession, room: rtc.Room, stt_engine: livekit_stt.STT, llm_engine: llm.LLM, tts_engine: livekit_tts.TTS, vad_engine: livekit_vad.VAD, turn_detector) -> None:
         super().__init__(
             instructions="You are a helpful voice AI assistant.Note: If asked to print to the console, use the `print_to_console` function.",
             stt=stt_engine,
@@ -67,6 +50,7 @@ class Assistant(Agent):
             turn_detection=turn_detector
         )
         print("Assistant Init")
+        self.audio_out = None  # SessionAudioOutput for publish_audio, created on first use
         # self.session = session  # Keep a reference to the session
         # self.room = room
     # def __init__(self) -> None:
@@ -93,28 +77,34 @@ class Assistant(Agent):
         logger.info(f"Assistant received user message: {new_message.content}")
         print("EndofTurn")
         try:
-            response = model.generate_content(new_message.content)
-            ai_response = response.text
-            logger.info(f"Assistant LLM Response: {ai_response}")
+            turn_ctx = llm.ChatContext()
+            turn_ctx.add_message(role="user", content=new_message.content)
 
-            # Generate TTS audio and say it
-            await self.session.say(ai_response)
+            # Stream the reply into TTS sentence by sentence instead of waiting for all of it.
+            # If the user barges in, the session closes the text stream and the request is cancelled.
+            stream = self.llm.chat(chat_ctx=turn_ctx)
+            handle = self.session.say(sentence_chunks(stream), allow_interruptions=True)
+            await handle
+            if handle.interrupted:
+                logger.info("Assistant reply interrupted by the user")
 
         except Exception as e:
             logger.error(f"Assistant error processing turn: {e}")
 
     async def on_exit(self) -> None:
         print("Exit")
+        if self.audio_out is not None:
+            await self.audio_out.aclose()
     async def publish_audio(self, room: rtc.Room, audio_data: bytes):
         # This function might not be needed directly anymore if 'session.say' handles publishing.
         logger.info("Assistant publishing generated audio...")
         try:
-            audio_track = rtc.LocalAudioTrack.create_opus_track(name="agent_audio")
-            publication = await room.local_participant.publish_track(audio_track)
-            await audio_track.sink.write_frame(audio_data) # You might need to adjust this based on audio format
-            duration_seconds = len(audio_data) / (48000 * 2 * 2) if audio_data else 1
-            await asyncio.sleep(duration_seconds + 0.5) # Add a small buffer
-            await room.local_participant.unpublish_track(publication.sid)
+            # The track is published on first use and reused for every utterance of the session
+            if self.audio_out is None:
+                self.audio_out = SessionAudioOutput(room, sample_rate=48000, num_channels=2)
+                await self.audio_out.start()
+            await self.audio_out.write(audio_data)
+            await self.audio_out.flush()
             logger.info("Assistant audio published successfully.")
         except Exception as e:
             logger.error(f"Assistant error publishing audio: {e}")
@@ -122,6 +112,8 @@ class Assistant(Agent):
 
 async def entrypoint(ctx: agents.JobContext):
     logger.info(f"starting transcriber (STT), room: {ctx.room.name}")
+    watch_job(ctx)  # stalls of the shared event loop are attributed to this room until the job ends
+    setup_timer = JobSetupTimer(ctx.room.name)
 
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
     participant = await ctx.wait_for_participant()
@@ -130,22 +122,27 @@ async def entrypoint(ctx: agents.JobContext):
 
     stt_engine = deepgram.STT(model="nova-2-general", language="en-US", interim_results=True, smart_format=True, punctuate=True, filler_words=True, profanity_filter=False, keywords=[("LiveKit", 1.5)])
     tts_engine = cartesia.TTS(model="sonic-2")
-    vad_engine = silero.VAD.load()
-    turn_detector = MultilingualModel()
+    vad_engine = registry.vad()
+    turn_detector = registry.turn_detector()
 
-    # assistant = Assistant(None, ctx.room, stt_engine, model, tts_engine, vad_engine, turn_detector) # Pass engines to Assistant
+    # assistant = Assistant(None, ctx.room, stt_engine, llm_engine, tts_engine, vad_engine, turn_detector) # Pass engines to Assistant
 
     is_user_speaking = False
     is_agent_speaking = False
 
+    llm_engine = GeminiLLM(model="gemini-2.0-flash")
+
     session = AgentSession(
         turn_detection=turn_detector,
         stt=stt_engine,
         vad=vad_engine,
-        llm=groq.LLM(model="llama-3.3-70b-versatile"),#model,
+        llm=llm_engine,
         tts=tts_engine,
     )
     # assistant.session = session # Now it might be okay to set the session here
+    setup_timer.watch(session)
+    tracer = LatencyTracer(session, ctx.room.name, "Assistant")
+    ctx.add_shutdown_callback(tracer.aclose)  # the last turns and calls shorter than the dump interval
 
     agent1 = Agent(
         instructions="""
@@ -154,7 +151,7 @@ async def entrypoint(ctx: agents.JobContext):
             Only use the `lookup_weather` tool if the user specifically asks for weather information.
             Never assume a location or provide weather data without a request.
             """,)
-    agent = Assistant(session=session, room=ctx.room, stt_engine=stt_engine, llm_engine=model, tts_engine=tts_engine, vad_engine=vad_engine, turn_detector=turn_detector)
+    agent = Assistant(session=session, room=ctx.room, stt_engine=stt_engine, llm_engine=llm_engine, tts_engine=tts_engine, vad_engine=vad_engine, turn_detector=turn_detector)
     await session.start(
         room=ctx.room,
         agent=agent
@@ -162,6 +159,7 @@ async def entrypoint(ctx: agents.JobContext):
         #     noise_cancellation=None, # Noise cancellation removed
         # ),
     )
+    setup_timer.mark("session started")
     # asyncio.create_task(
     #     session.start(
     #         agent=Assistant(),
@@ -186,4 +184,4 @@ async def entrypoint(ctx: agents.JobContext):
         print("track_subscribed")
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm) )
\ No newline at end of file
+    agents.cli.run_app(scheduler.worker_options(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm) )
\ No newline at end of file
@@ -0,0 +1,180 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Iterable
+
+from livekit import rtc
+from livekit.agents import tts as livekit_tts
+
+logger = logging.getLogger("soul_agent")
+
+DEFAULT_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "soul_tts_cache"))
+DEFAULT_MAX_DISK_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_MAX_MAPPED = 64
+FRAME_MS = 20
+NUM_CHANNELS = 1
+BYTES_PER_SAMPLE = 2
+
+
+def cache_key(text: str, voice_id: str, model: str, sample_rate: int) -> str:
+    raw = json.dumps([text, voice_id, model, sample_rate], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CachedAudio:
+    def __init__(self, path: str, sample_rate: int) -> None:
+        self.path = path
+        self.sample_rate = sample_rate
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self._mmap)
+
+    @property
+    def duration(self) -> float:
+        return self.size / (self.sample_rate * NUM_CHANNELS * BYTES_PER_SAMPLE)
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        # Frames are read from the mapping one at a time: AudioFrame copies its 20 ms slice,
+        # the rest of the line stays in the page cache shared by every process
+        samples_per_frame = self.sample_rate * FRAME_MS // 1000
+        frame_bytes = samples_per_frame * NUM_CHANNELS * BYTES_PER_SAMPLE
+        view = memoryview(self._mmap)
+        for offset in range(0, self.size, frame_bytes):
+            chunk = view[offset:offset + frame_bytes]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=self.sample_rate,
+                num_channels=NUM_CHANNELS,
+                samples_per_channel=len(chunk) // (NUM_CHANNELS * BYTES_PER_SAMPLE),
+            )
+
+    def close(self) -> None:
+        try:
+            self._mmap.close()
+        except BufferError:
+            # a frame still points into the mapping, it is released with the last reference
+            pass
+
+
+class AudioCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 max_mapped: int = DEFAULT_MAX_MAPPED) -> None:
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_mapped = max_mapped
+        self._mapped: OrderedDict[str, CachedAudio] = OrderedDict()
+        self._lock = threading.Lock()
+        self._fill_tasks: set[asyncio.Task] = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, text: str, voice_id: str, model: str, sample_rate: int) -> CachedAudio | None:
+        key = cache_key(text, voice_id, model, sample_rate)
+        with self._lock:
+            audio = self._mapped.get(key)
+            if audio is not None:
+                self._mapped.move_to_end(key)
+                return audio
+
+            path = self._path(key)
+            try:
+                # mtime doubles as the on-disk LRU clock shared by every process
+                os.utime(path)
+                audio = CachedAudio(path, sample_rate)
+            except (FileNotFoundError, ValueError):
+                return None
+
+            self._mapped[key] = audio
+            while len(self._mapped) > self.max_mapped:
+                _, evicted = self._mapped.popitem(last=False)
+                evicted.close()
+            return audio
+
+    def put(self, text: str, voice_id: str, model: str, sample_rate: int, pcm: bytes) -> None:
+        key = cache_key(text, voice_id, model, sample_rate)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".pcm-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def prewarm(self, lines: Iterable[str], voice_id: str, model: str, sample_rate: int) -> None:
+        """Map the lines already on disk, without touching the network; a job fills in the rest."""
+        missing = [text for text in lines if self.get(text, voice_id, model, sample_rate) is None]
+        if missing:
+            logger.info(f"{len(missing)} fixed lines are not in the TTS cache yet, they go through TTS until a job fills them")
+
+    async def fill(self, tts_engine: livekit_tts.TTS, lines: Iterable[str], voice_id: str, model: str) -> None:
+        """Synthesize the lines that are not on disk yet, one at a time."""
+        with open(os.path.join(self.directory, ".fill.lock"), "a") as lock_file:
+            try:
+                # one job per host fills the cache, the others would synthesize the same lines
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            for text in lines:
+                if self.get(text, voice_id, model, tts_engine.sample_rate) is not None:
+                    continue
+
+                pcm = bytearray()
+                async with tts_engine.synthesize(text) as stream:
+                    async for audio in stream:
+                        pcm += audio.frame.data.cast("B")
+                await asyncio.to_thread(self.put, text, voice_id, model, tts_engine.sample_rate, bytes(pcm))
+                logger.info(f"Cached {len(pcm)} bytes of TTS audio for: {text[:40]}")
+
+    def fill_in_background(self, tts_engine: livekit_tts.TTS, lines: Iterable[str], voice_id: str, model: str) -> None:
+        # runs on the job's loop with the job's TTS, behind the call; lines not cached yet go through TTS meanwhile
+        lines = list(lines)
+
+        async def _fill():
+            try:
+                await self.fill(tts_engine, lines, voice_id, model)
+            except Exception as e:
+                logger.warning(f"Could not pre-synthesize fixed lines, they will go through TTS: {e}")
+
+        task = asyncio.create_task(_fill(), name="tts-cache-fill")
+        self._fill_tasks.add(task)
+        task.add_done_callback(self._fill_tasks.discard)
+
+
+audio_cache = AudioCache()
+
+
+def say_cached(session, text: str, voice_id: str, model: str, sample_rate: int, **kwargs):
+    audio = audio_cache.get(text, voice_id, model, sample_rate)
+    if audio is None:
+        return session.say(text, **kwargs)
+    return session.say(text, audio=audio.frames(), **kwargs)
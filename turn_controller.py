@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from livekit.agents import AgentSession, metrics
+
+logger = logging.getLogger("soul_agent")
+
+# late TTS metrics and the playback report of an interrupted speech arrive within this
+SETTLE_SECONDS = 1.0
+
+
+class _Turn:
+    def __init__(self, controller: "TurnController") -> None:
+        self._controller = controller
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> None:
+        self._task = asyncio.current_task()
+        previous = self._controller._turn_task
+        if previous is not None and previous is not self._task and not previous.done():
+            # a newly committed user turn supersedes the one still being handled
+            self._controller._barged_in.add(previous)
+            previous.cancel()
+        self._controller._turn_task = self._task
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if self._controller._turn_task is self._task:
+            self._controller._turn_task = None
+        if exc_type is asyncio.CancelledError and self._task in self._controller._barged_in:
+            # cancelled by a barge-in, not by the session: the caller's task goes on
+            self._controller._barged_in.discard(self._task)
+            if hasattr(self._task, "uncancel"):
+                self._task.uncancel()
+            return True
+        return False
+
+
+class TurnController:
+    """Stops everything the agent is doing for a turn once the session decides the user barged in.
+
+    The session keeps its own interruption rules: a speech is interrupted only
+    after min_interruption_duration (and min_interruption_words) of user
+    speech, and a speech paused by a false interruption resumes. When the
+    session does interrupt a speech, the turn handler running inside
+    `async with controller.turn():` is cancelled at whatever await it is in,
+    so nothing more is filled, generated or said for that turn. A user turn
+    committed while the previous one is still being handled supersedes it.
+
+    Each barge-in is logged with its interrupt-to-silence latency and the
+    seconds of synthesized audio that were never played.
+    """
+
+    def __init__(self, session: AgentSession, name: str = "agent") -> None:
+        self._session = session
+        self.name = name
+        self._turn_task: asyncio.Task | None = None
+        self._barged_in: set[asyncio.Task] = set()
+        self._agent_state = "initializing"
+        self._pending: set[str] = set()
+        self._user_started_at: float | None = None
+        self._silent_at: float | None = None
+        self._synthesized: dict[str, float] = defaultdict(float)
+        self._played: dict[str, float] = {}
+        self.barge_ins = 0
+        self.silence_ms: list[float] = []
+        self.wasted_seconds = 0.0
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+        session.on("speech_created", self._on_speech_created)
+        session.on("metrics_collected", self._on_metrics_collected)
+        self._audio_output = session.output.audio
+        if self._audio_output is not None:
+            self._audio_output.on("playback_finished", self._on_playback_finished)
+
+    def turn(self) -> _Turn:
+        return _Turn(self)
+
+    def add_synthesized(self, speech_id: str, seconds: float) -> None:
+        """Audio synthesized outside the session's TTS node for a speech, e.g. by TurnOutput."""
+        self._synthesized[speech_id] += seconds
+
+    def _on_user_state_changed(self, ev) -> None:
+        # only a possible barge-in, the session decides whether it interrupts
+        if ev.new_state == "speaking" and self._agent_state == "speaking":
+            self._user_started_at = time.perf_counter()
+
+    def _on_agent_state_changed(self, ev) -> None:
+        self._agent_state = ev.new_state
+        if ev.old_state != "speaking":
+            return
+        self._silent_at = time.perf_counter()
+        # only interrupted speeches are accounted for
+        for accounts in (self._synthesized, self._played):
+            for speech_id in list(accounts):
+                if speech_id not in self._pending:
+                    del accounts[speech_id]
+
+    def _on_speech_created(self, ev) -> None:
+        ev.speech_handle.add_done_callback(self._on_speech_done)
+
+    def _on_speech_done(self, speech) -> None:
+        if not speech.interrupted:
+            self._user_started_at = None  # a false interruption, the speech resumed and played out
+            return
+        if self._user_started_at is None:
+            return  # stopped by the agent itself or the session closing
+        self.barge_ins += 1
+        if self._silent_at is not None and self._silent_at >= self._user_started_at:
+            elapsed = (self._silent_at - self._user_started_at) * 1000
+            self.silence_ms.append(elapsed)
+            logger.info(f"[{self.name}] barge-in: agent silent {elapsed:.0f}ms after the user started speaking")
+        self._user_started_at = None
+
+        if self._turn_task is not None and not self._turn_task.done():
+            self._barged_in.add(self._turn_task)
+            self._turn_task.cancel()
+        self._pending.add(speech.id)
+        asyncio.get_running_loop().call_later(SETTLE_SECONDS, self._report_waste, speech.id)
+
+    def _on_metrics_collected(self, ev) -> None:
+        if isinstance(ev.metrics, metrics.TTSMetrics) and ev.metrics.speech_id:
+            self._synthesized[ev.metrics.speech_id] += ev.metrics.audio_duration
+
+    def _on_playback_finished(self, ev) -> None:
+        speech = self._session.current_speech
+        if speech is not None:
+            self._played[speech.id] = ev.playback_position
+
+    def _report_waste(self, speech_id: str) -> None:
+        self._pending.discard(speech_id)
+        synthesized = self._synthesized.pop(speech_id, 0.0)
+        played = self._played.pop(speech_id, 0.0)
+        wasted = max(0.0, synthesized - played)
+        self.wasted_seconds += wasted
+        logger.info(
+            f"[{self.name}] barge-in: {wasted:.1f}s of synthesized audio never played "
+            f"({synthesized:.1f}s synthesized, {played:.1f}s played, {self.wasted_seconds:.1f}s this session)"
+        )
+
+    def close(self) -> None:
+        self._session.off("user_state_changed", self._on_user_state_changed)
+        self._session.off("agent_state_changed", self._on_agent_state_changed)
+        self._session.off("speech_created", self._on_speech_created)
+        self._session.off("metrics_collected", self._on_metrics_collected)
+        if self._audio_output is not None:
+            self._audio_output.off("playback_finished", self._on_playback_finished)
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator
+
+from livekit import rtc
+from livekit.agents import AgentSession
+
+from tts_cache import audio_cache
+from turn_controller import TurnController
+
+logger = logging.getLogger("soul_agent")
+
+
+class _Line:
+    """The audio of one line, available as soon as it is created.
+
+    Lines in the local TTS cache are read from there; the others start
+    synthesizing right away and buffer their frames until they are played.
+    """
+
+    def __init__(self, session: AgentSession, text: str, voice_id: str | None, model: str | None) -> None:
+        self.text = text
+        self.started_at = time.perf_counter()
+        self.first_frame_at: float | None = None
+        self.synthesized = 0.0  # seconds
+        self._cached = audio_cache.get(text, voice_id, model, session.tts.sample_rate) if voice_id else None
+        self._queue: asyncio.Queue[rtc.AudioFrame | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        if self._cached is not None:
+            self.first_frame_at = self.started_at
+        else:
+            self._task = asyncio.create_task(self._synthesize(session), name="turn-output-tts")
+
+    async def _synthesize(self, session: AgentSession) -> None:
+        try:
+            async with session.tts.synthesize(self.text) as stream:
+                async for audio in stream:
+                    if self.first_frame_at is None:
+                        self.first_frame_at = time.perf_counter()
+                    self.synthesized += audio.frame.duration
+                    self._queue.put_nowait(audio.frame)
+        except Exception as e:
+            logger.error(f"Error synthesizing '{self.text[:40]}': {e}")
+        finally:
+            self._queue.put_nowait(None)
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        if self._cached is not None:
+            async for frame in self._cached.frames():
+                yield frame
+            return
+        while (frame := await self._queue.get()) is not None:
+            yield frame
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class TurnOutput:
+    """Says the lines of one agent turn as a single, gapless utterance.
+
+    Every line's audio is started at once, so the next question is being
+    synthesized (or read from the TTS cache) while the acknowledgement plays,
+    instead of after it. The lines are played in order through one
+    session.say(), so interrupting the acknowledgement drops the question
+    too. For each line after the first, the synthesis time hidden behind
+    the previous line and the gap that was left are logged.
+    """
+
+    def __init__(self, session: AgentSession, voice_id: str | None = None, model: str | None = None,
+                 controller: TurnController | None = None) -> None:
+        self.session = session
+        self.voice_id = voice_id
+        self.model = model
+        self.controller = controller
+        self.hidden_ms = 0.0
+        self.gap_ms = 0.0
+        self.joins = 0
+
+    def say(self, *texts: str):
+        lines = [_Line(self.session, text, self.voice_id, self.model) for text in texts]
+        handle = self.session.say(" ".join(texts), audio=self._play(lines))
+
+        def _cancel(_) -> None:
+            # an utterance interrupted before it started playing never pulls its audio
+            for line in lines:
+                line.cancel()
+            if self.controller is not None and handle.interrupted:
+                self.controller.add_synthesized(handle.id, sum(line.synthesized for line in lines))
+
+        handle.add_done_callback(_cancel)
+        return handle
+
+    async def _play(self, lines: list[_Line]) -> AsyncIterator[rtc.AudioFrame]:
+        # closed by the session when the speech is interrupted, which stops the synthesis still running
+        try:
+            previous_done = None
+            for line in lines:
+                first = True
+                async for frame in line.frames():
+                    if first and previous_done is not None:
+                        self._record_join(line, previous_done)
+                    first = False
+                    yield frame
+                previous_done = time.perf_counter()
+        finally:
+            for line in lines:
+                line.cancel()
+
+    def _record_join(self, line: _Line, previous_done: float) -> None:
+        ready_at = line.first_frame_at or time.perf_counter()
+        gap = max(0.0, ready_at - previous_done)
+        hidden = (ready_at - line.started_at) - gap
+        self.hidden_ms += hidden * 1000
+        self.gap_ms += gap * 1000
+        self.joins += 1
+        logger.info(
+            f"Turn output: '{line.text[:30]}' was ready {(ready_at - line.started_at) * 1000:.0f}ms after the turn started, "
+            f"{hidden * 1000:.0f}ms of it hidden behind the previous line, {gap * 1000:.0f}ms gap left"
+        )
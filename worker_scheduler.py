@@ -0,0 +1,165 @@
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+import psutil
+from livekit.agents import JobExecutorType, JobRequest, WorkerOptions
+from livekit.agents.utils.hw import get_cpu_monitor
+
+from plugin_registry import plugins
+
+logger = logging.getLogger("soul_agent")
+
+LOAD_TARGET = float(os.getenv("WORKER_LOAD_TARGET", "0.7"))
+# "thread" hosts every session in the worker process instead of one process per room
+JOB_EXECUTOR = os.getenv("WORKER_JOB_EXECUTOR")
+STATE_PATH = os.getenv("WORKER_STATE_PATH", os.path.join(tempfile.gettempdir(), "soul_agent_worker.json"))
+# cores one session costs before anything has been measured
+DEFAULT_SESSION_COST = float(os.getenv("WORKER_SESSION_COST", "0.1"))
+# how long it takes to spawn and prewarm a replacement process
+PREWARM_SECONDS = float(os.getenv("WORKER_PREWARM_SECONDS", "10"))
+# accepted jobs count towards the load until they show up as running
+START_GRACE = 5.0
+ARRIVAL_WINDOW = 300.0
+
+
+class AdmissionController:
+    """Accepts jobs against a CPU budget measured from the sessions already running.
+
+    load() is the worker's load_fnc: it samples the CPU time of the worker and
+    its job/inference processes (VAD, turn detector, audio encoding all live
+    there) and keeps a moving average of cores per running session. request()
+    accepts a job only if one more session fits under `target`, counting jobs
+    that were accepted but have not started yet.
+
+    The job arrival rate sizes the prewarmed process pool: enough idle processes
+    to cover the arrivals expected while a replacement prewarms. The worker only
+    reads num_idle_processes at startup, so the recommendation is persisted and
+    used by the next start.
+    """
+
+    def __init__(self, target: float = LOAD_TARGET, state_path: str = STATE_PATH) -> None:
+        self.target = target
+        self.state_path = state_path
+        self.cpu_count = get_cpu_monitor().cpu_count()
+        self.session_cost = DEFAULT_SESSION_COST
+        self.cores_busy = 0.0
+        self.active_sessions = 0
+        self._accepted: deque[float] = deque()
+        self._arrivals: deque[float] = deque()
+        self._lock = threading.Lock()
+        self._last_sample: tuple[float, float] | None = None
+        self._recommended_idle = self._load_idle_target()
+        self._unsaved_idle: int | None = None
+
+    def _load_idle_target(self) -> int:
+        try:
+            with open(self.state_path) as f:
+                return int(json.load(f)["idle_processes"])
+        except (OSError, ValueError, KeyError):
+            return max(1, math.ceil(self.cpu_count / 2))
+
+    def _save_idle_target(self, idle: int) -> None:
+        directory = os.path.dirname(self.state_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"idle_processes": idle, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _cpu_seconds(self) -> float:
+        process = psutil.Process()
+        total = 0.0
+        for proc in [process, *process.children(recursive=True)]:
+            try:
+                times = proc.cpu_times()
+            except psutil.Error:
+                continue  # exited between listing and sampling
+            total += times.user + times.system
+        return total
+
+    def load(self, worker) -> float:
+        # runs in a thread of the worker's executor every few hundred ms
+        now = time.monotonic()
+        cpu = self._cpu_seconds()
+        active = len(worker.active_jobs)
+        with self._lock:
+            if self._last_sample is not None:
+                last_at, last_cpu = self._last_sample
+                if now > last_at:
+                    # children that exited take their CPU time with them, never go negative
+                    self.cores_busy = max(0.0, cpu - last_cpu) / (now - last_at)
+            self._last_sample = (now, cpu)
+            self.active_sessions = active
+            if active:
+                self.session_cost = 0.8 * self.session_cost + 0.2 * (self.cores_busy / active)
+            load = min(1.0, self.cores_busy / self.cpu_count)
+            unsaved, self._unsaved_idle = self._unsaved_idle, None
+
+        # file I/O stays off the event loop, this is already on an executor thread
+        if unsaved is not None:
+            try:
+                self._save_idle_target(unsaved)
+            except OSError as e:
+                logger.warning(f"Could not persist idle process target: {e}")
+        return load
+
+    def _starting(self, now: float) -> int:
+        while self._accepted and now - self._accepted[0] > START_GRACE:
+            self._accepted.popleft()
+        return len(self._accepted)
+
+    async def request(self, req: JobRequest) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._arrivals.append(now)
+            starting = self._starting(now)
+            projected = (self.cores_busy + (starting + 1) * self.session_cost) / self.cpu_count
+            admit = projected <= self.target
+            if admit:
+                self._accepted.append(now)
+
+        self._update_idle_target(now)
+        if not admit:
+            logger.warning(
+                f"Rejecting job for room {req.room.name}: projected load {projected:.2f} over target {self.target:.2f} "
+                f"({self.active_sessions} sessions at {self.session_cost:.2f} cores each)"
+            )
+            await req.reject()
+            return
+
+        await req.accept()
+
+    def _update_idle_target(self, now: float) -> None:
+        with self._lock:
+            while self._arrivals and now - self._arrivals[0] > ARRIVAL_WINDOW:
+                self._arrivals.popleft()
+            rate = len(self._arrivals) / ARRIVAL_WINDOW
+            max_idle = max(1, math.floor(self.target * self.cpu_count / self.session_cost))
+        # Little's law: arrivals expected while one replacement process prewarms, plus one spare
+        idle = min(max_idle, math.ceil(rate * PREWARM_SECONDS) + 1)
+        if idle != self._recommended_idle:
+            logger.info(f"Arrival rate {rate * 60:.1f}/min, prewarmed processes for the next start: {idle}")
+            self._recommended_idle = idle
+            with self._lock:
+                self._unsaved_idle = idle
+
+    def worker_options(self, **kwargs) -> WorkerOptions:
+        if JOB_EXECUTOR:
+            kwargs.setdefault("job_executor_type", JobExecutorType(JOB_EXECUTOR))
+        # the plugins the agent selected are imported once in the forkserver, not in every job process
+        kwargs.setdefault("preload_modules", plugins.preload_modules())
+        return WorkerOptions(
+            request_fnc=self.request,
+            load_fnc=self.load,
+            load_threshold=self.target,
+            num_idle_processes=self._recommended_idle,
+            **kwargs,
+        )
+
+
+scheduler = AdmissionController()